@@ -1,3 +1,5 @@
+import copy
+import os
 import random
 import numpy as np
 import pandas as pd
@@ -7,7 +9,11 @@ from torch import optim
 
 from QNetwork import QNetwork
 from Buffer import Buffer
+from PrioritizedBuffer import PrioritizedBuffer
 from Environment import Environment
+from Dataset import Dataset
+from DatasetSchema import DatasetSchema
+from RunningTracker import RunningTracker
 
 
 class Agent:
@@ -16,7 +22,9 @@ class Agent:
     """
 
     def __init__(self, env: Environment, buffer_size: int = 100000, batch_size: int = 64, gamma: float = 0.99,
-                 lr: float = 0.0001) -> None:
+                 lr: float = 0.0001, target_update: int = 100, tau: float = None, train_every: int = 1,
+                 gradient_steps: int = 1, prioritized: bool = False, alpha: float = 0.6, beta: float = 0.4,
+                 double: bool = False, tracker: RunningTracker = None) -> None:
         """
         Function to init agent
 
@@ -25,29 +33,63 @@ class Agent:
         :param batch_size: model batch size
         :param gamma: gamma
         :param lr: learning rate
+        :param target_update: optimizer steps between hard updates of target network
+        :param tau: Polyak coefficient of soft target update after every optimizer step (None for hard updates)
+        :param train_every: environment steps between trainings
+        :param gradient_steps: optimizer steps for every training
+        :param prioritized: use prioritized experience replay
+        :param alpha: priority exponent of prioritized buffer
+        :param beta: importance-sampling exponent of prioritized buffer
+        :param double: Double DQN target (next action chosen by Q network, valued by target network)
+        :param tracker: tracker of training phases (None to disable)
         """
 
         # Environment
         self.__env = env
 
-        # State and action dimensions
-        self.__state_dim = env.return_dataset().state_dim()
-        self.__action_dim = env.return_dataset().action_dim()
+        # Columns layout, state and action dimensions
+        self.__schema = env.return_dataset().return_schema()
+        self.__state_dim = self.__schema.state_dim()
+        self.__action_dim = self.__schema.action_dim()
 
         # Model parameters
         self.__batch_size = batch_size
         self.__gamma = gamma
         self.__lr = lr
+        self.__target_update = target_update
+        self.__tau = tau
+        self.__train_every = train_every
+        self.__gradient_steps = gradient_steps
+        self.__prioritized = prioritized
+        self.__double = double
+
+        # Counters of steps
+        self.__env_steps = 0
+        self.__optimizer_steps = 0
 
         # QNetwork parameters
         self.__q_network = QNetwork(self.__state_dim, self.__action_dim)
         self.__optimizer = optim.Adam(self.__q_network.parameters(), lr=lr)
 
+        # Frozen target network for next state Q values
+        self.__target_network = QNetwork(self.__state_dim, self.__action_dim)
+        self.__target_network.load_state_dict(self.__q_network.state_dict())
+        self.__target_network.requires_grad_(False)
+
         # Buffer of agent
-        self.__buffer = Buffer(buffer_size)
+        if prioritized:
+            self.__buffer = PrioritizedBuffer(buffer_size, self.__state_dim, alpha=alpha, beta=beta)
+        else:
+            self.__buffer = Buffer(buffer_size, self.__state_dim)
 
-        # Function of loss for training
-        self.__loss = nn.CrossEntropyLoss()
+        # Tracker of training phases
+        self.__tracker = RunningTracker(enabled=False) if tracker is None else tracker
+        self.__buffer.set_tracker(self.__tracker)
+
+        # Function of TD loss for training (per element, for importance-sampling weights), squared error keeps Q values
+        # at mean of bootstrapped targets
+        self.__loss = nn.MSELoss(reduction='none')
+        self.__last_loss = None
 
     def act(self, state: list or np.array, epsilon: float) -> int:
         """
@@ -63,37 +105,118 @@ class Agent:
             return random.choice(range(self.__action_dim))
         else:
             with torch.no_grad():
-                q_values = self.__q_network.forward(torch.tensor(state).float())
+                q_values = self.__q_network.forward(torch.as_tensor(state, dtype=torch.float32))
                 return q_values.argmax().item()
 
-    def train(self) -> None:
+    def act_batch(self, states: np.ndarray, epsilon: float) -> np.ndarray:
+        """
+        Function to return actions for batch of states by one forward pass
+
+        :param states: states (rows x state dimensional)
+        :param epsilon: epsilon
+        :return: actions
+        """
+
+        actions = self.__q_network.predict_batch(states)[0]
+
+        # Epsilon-greedy exploration strategy for every state
+        explore = np.random.random(len(actions)) < epsilon
+        actions[explore] = np.random.randint(self.__action_dim, size=explore.sum())
+
+        return actions
+
+    def train(self) -> float:
         """
         Function to train agent
 
-        :return: None
+        :return: loss value
         """
 
-        # Take buffer sample
-        states, actions, rewards, next_states, dones = self.__buffer.sample(self.__batch_size)
+        # Take buffer sample as ready batch tensors
+        if not self.__prioritized:
+            return self.train_batch(*self.__buffer.sample(self.__batch_size))
 
-        # Samples to tensors
-        states = torch.tensor(states).float()
-        actions = torch.tensor(actions).unsqueeze(1)
-        rewards = torch.tensor(rewards).unsqueeze(1)
-        next_states = torch.tensor(next_states).float()
-        dones = torch.tensor(dones).unsqueeze(1)
+        # Prioritized sample with importance-sampling weights and TD errors priorities update
+        *batch, weights, indices = self.__buffer.sample(self.__batch_size)
+        loss, td_errors = self.__optimize(*batch, weights)
+        self.__buffer.update_priorities(indices, td_errors)
 
-        # Forward and backward Q network
-        q_values = self.__q_network.forward(states).gather(1, actions)
+        return loss
 
-        next_q_values = self.__q_network.forward(next_states).max(1)[0].unsqueeze(1)
-        target_q_values = rewards + self.__gamma * next_q_values * (1 - dones)
+    def train_batch(self, states: torch.Tensor, actions: torch.Tensor, rewards: torch.Tensor,
+                    next_states: torch.Tensor, dones: torch.Tensor) -> float:
+        """
+        Function to make one optimizer step on given batch
+
+        :param states: batch of states
+        :param actions: batch of actions (column)
+        :param rewards: batch of rewards (column)
+        :param next_states: batch of next states
+        :param dones: batch of dones (column)
+        :return: loss value
+        """
 
-        loss = self.__loss(q_values, target_q_values)
+        return self.__optimize(states, actions, rewards, next_states, dones)[0]
 
-        self.__optimizer.zero_grad()
-        loss.backward()
-        self.__optimizer.step()
+    def __optimize(self, states: torch.Tensor, actions: torch.Tensor, rewards: torch.Tensor,
+                   next_states: torch.Tensor, dones: torch.Tensor, weights: torch.Tensor = None) -> tuple[float,
+                                                                                                        np.ndarray]:
+        """
+        Function to make one optimizer step on given batch with optional importance-sampling weights
+
+        :param states: batch of states
+        :param actions: batch of actions (column)
+        :param rewards: batch of rewards (column)
+        :param next_states: batch of next states
+        :param dones: batch of dones (column)
+        :param weights: importance-sampling weights (column, None for equal weights)
+        :return: tuple of loss value and TD errors
+        """
+
+        # Forward Q network
+        with self.__tracker.track('forward'):
+            q_values = self.__q_network.forward(states).gather(1, actions)
+
+            with torch.no_grad():
+                # Double DQN does not take maximum of noisy target values, so Q values are not overestimated
+                if self.__double:
+                    next_actions = self.__q_network.forward(next_states).argmax(1, keepdim=True)
+                    next_q_values = self.__target_network.forward(next_states).gather(1, next_actions)
+                else:
+                    next_q_values = self.__target_network.forward(next_states).max(1)[0].unsqueeze(1)
+                target_q_values = rewards + self.__gamma * next_q_values * (1 - dones)
+
+            losses = self.__loss(q_values, target_q_values)
+            loss = losses.mean() if weights is None else (losses * weights).mean()
+
+        # Backward Q network
+        with self.__tracker.track('backward'):
+            self.__optimizer.zero_grad()
+            loss.backward()
+
+        with self.__tracker.track('optimizer_step'):
+            self.__optimizer.step()
+        self.__optimizer_steps += 1
+
+        self.update_target()
+
+        self.__last_loss = loss.item()
+
+        return self.__last_loss, (target_q_values - q_values.detach()).squeeze(1).numpy()
+
+    def update_target(self) -> None:
+        """
+        Function to update target network (soft update if tau is set, else hard update by cadence)
+
+        :return: None
+        """
+
+        if self.__tau is not None:
+            with torch.no_grad():
+                for target, source in zip(self.__target_network.parameters(), self.__q_network.parameters()):
+                    target.mul_(1 - self.__tau).add_(source, alpha=self.__tau)
+        elif self.__optimizer_steps % self.__target_update == 0:
+            self.__target_network.load_state_dict(self.__q_network.state_dict())
 
     def run_episode(self, epsilon: float) -> list:
         """
@@ -110,17 +233,73 @@ class Agent:
 
         # Train for every case in episode
         while not done:
-            action = self.act(state, epsilon)
-            next_state, reward, done = self.__env.step(action)
+            with self.__tracker.track('act'):
+                action = self.act(state, epsilon)
+            with self.__tracker.track('env_step'):
+                next_state, reward, done = self.__env.step(action)
             rewards.append(reward)
-            self.__buffer.add(state, action, reward, next_state, done)
+            with self.__tracker.track('buffer_add'):
+                self.__buffer.add(state, action, reward, next_state, done)
             state = next_state
-            if len(self.__buffer) >= self.__batch_size:
-                self.train()
+            self.__env_steps += 1
+            if len(self.__buffer) >= self.__batch_size and self.__env_steps % self.__train_every == 0:
+                for _ in range(self.__gradient_steps):
+                    self.train()
 
         return rewards
 
-    def buffer_append(self, state: list or np.array, action: list or np.array, reward: float,
+    def rollout(self, epsilon: float, case_num: int = None) -> tuple[np.ndarray, np.ndarray, np.ndarray,
+                                                                     np.ndarray, np.ndarray]:
+        """
+        Function to run one episode without training and return its transitions
+
+        :param epsilon: epsilon
+        :param case_num: number of case (next case if None)
+        :return: tuple of (states, actions, rewards, next_states, dones) arrays
+        """
+
+        state = self.__env.reset() if case_num is None else self.__env.reset(case_num=case_num)
+        done = False
+        transitions = []
+
+        while not done:
+            action = self.act(state, epsilon)
+            next_state, reward, done = self.__env.step(action)
+            transitions.append((state, action, reward, next_state, done))
+            state = next_state
+
+        states, actions, rewards, next_states, dones = zip(*transitions)
+
+        return (np.array(states, dtype=np.float32), np.array(actions, dtype=np.int64),
+                np.array(rewards, dtype=np.float32), np.array(next_states, dtype=np.float32),
+                np.array(dones, dtype=np.float32))
+
+    def learn(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+              dones: np.ndarray) -> None:
+        """
+        Function to add transitions collected elsewhere in buffer and train with the same cadence as run_episode
+
+        :param states: current states
+        :param actions: actions
+        :param rewards: rewards for actions
+        :param next_states: next states
+        :param dones: dones
+        :return: None
+        """
+
+        with self.__tracker.track('buffer_add'):
+            self.__buffer.add_batch(states, actions, rewards, next_states, dones)
+
+        # Count of trainings for new environment steps
+        count = len(actions)
+        trainings = (self.__env_steps + count) // self.__train_every - self.__env_steps // self.__train_every
+        self.__env_steps += count
+
+        if len(self.__buffer) >= self.__batch_size:
+            for _ in range(trainings * self.__gradient_steps):
+                self.train()
+
+    def buffer_append(self, state: list or np.array, action: int, reward: float,
                       next_state: list or np.array, done: bool) -> None:
         """
         Function to add new element in agent's buffer
@@ -135,6 +314,187 @@ class Agent:
 
         self.__buffer.add(state, action, reward, next_state, done)
 
+    def prefill_from_dataset(self) -> int:
+        """
+        Function to fill agent's buffer by all logged transitions of dataset
+
+        :return: count of added transitions
+        """
+
+        transitions = self.__env.return_transitions()
+        self.__buffer.add_batch(*transitions)
+
+        return len(transitions[1])
+
+    def predict_batch(self, states: np.ndarray, return_q_values: bool = False) -> list[str] or \
+            tuple[list[str], np.ndarray]:
+        """
+        Function to return predicts by agent for batch of states in one forward pass
+
+        :param states: states (rows x state dimensional)
+        :param return_q_values: return Q values of actions too
+        :return: list of actions names (and Q values if return_q_values)
+        """
+
+        actions, q_values = self.__q_network.predict_batch(states)
+        action_names = self.__schema.return_action_names()
+        predicts = [action_names[action] for action in actions]
+
+        if return_q_values:
+            return predicts, q_values
+
+        return predicts
+
+    def return_last_loss(self) -> float:
+        """
+        Function to return loss of last training step
+
+        :return: loss value (None if agent was not trained)
+        """
+
+        return self.__last_loss
+
+    def return_optimizer_steps(self) -> int:
+        """
+        Function to return count of optimizer steps made by agent
+
+        :return: count of optimizer steps
+        """
+
+        return self.__optimizer_steps
+
+    def return_tracker(self) -> RunningTracker:
+        """
+        Function to return tracker of training phases
+
+        :return: tracker
+        """
+
+        return self.__tracker
+
+    def return_q_network(self) -> QNetwork:
+        """
+        Function to return agent Q network
+
+        :return: Q network
+        """
+
+        return self.__q_network
+
+    def return_buffer(self) -> Buffer:
+        """
+        Function to return agent buffer
+
+        :return: buffer
+        """
+
+        return self.__buffer
+
+    def save(self, file_path: str or os.path, config: dict = None, replay_size: int = 0,
+             fingerprint: dict = None, state_means: tuple[list, int] = None) -> None:
+        """
+        Function to save trained agent network with dataset columns layout and training parameters
+
+        :param file_path: path to file
+        :param config: training parameters
+        :param replay_size: count of random buffer transitions saved for incremental training
+        :param fingerprint: fingerprint of training data (fingerprint of agent dataset if None)
+        :param state_means: tuple of means of training states and count of their rows (means of agent dataset if None)
+        :return: None
+        """
+
+        # Means of training states to impute missing values of predicted states
+        if state_means is None:
+            states = self.__env.return_dataset().return_arrays()['states']
+            state_means = ([float(mean) for mean in states.mean(axis=0, dtype=np.float64)], len(states))
+
+        saved = {'state_dict': self.__q_network.state_dict(),
+                 'columns': list(self.__schema.return_columns()),
+                 'config': config,
+                 'state_means': state_means[0],
+                 'state_rows': state_means[1]}
+
+        if replay_size:
+            arrays = self.__buffer.return_arrays()
+            indices = np.random.choice(len(self.__buffer), min(replay_size, len(self.__buffer)), replace=False)
+            saved['fingerprint'] = self.__env.return_dataset().fingerprint() if fingerprint is None else fingerprint
+            saved['replay'] = [torch.from_numpy(array[indices]) for array in arrays]
+
+        torch.save(saved, file_path)
+
+    def load(self, file_path: str or os.path) -> dict:
+        """
+        Function to load agent network saved by save
+
+        :param file_path: path to file
+        :return: saved data (state_dict, columns, config, state means and count of their rows)
+        """
+
+        saved = torch.load(file_path)
+        self.load_state(saved)
+
+        return saved
+
+    def load_state(self, saved: dict) -> None:
+        """
+        Function to load agent network from saved data
+
+        :param saved: saved data (state_dict, columns and config)
+        :return: None
+        """
+
+        if saved['columns'] != list(self.__schema.return_columns()):
+            raise ValueError('Saved agent was trained on dataset with another columns layout')
+
+        self.set_weights(saved['state_dict'])
+
+    def set_weights(self, state_dict: dict) -> None:
+        """
+        Function to set weights of Q network and target network
+
+        :param state_dict: Q network state_dict
+        :return: None
+        """
+
+        self.__q_network.load_state_dict(state_dict)
+        self.__target_network.load_state_dict(state_dict)
+
+    def return_checkpoint(self) -> dict:
+        """
+        Function to return copy of agent training state (networks, optimizer, counters, environment cursor and
+        buffer contents)
+
+        :return: dictionary of training state
+        """
+
+        return {'columns': list(self.__schema.return_columns()),
+                'q_network': copy.deepcopy(self.__q_network.state_dict()),
+                'target_network': copy.deepcopy(self.__target_network.state_dict()),
+                'optimizer': copy.deepcopy(self.__optimizer.state_dict()),
+                'env_steps': self.__env_steps,
+                'optimizer_steps': self.__optimizer_steps,
+                'case_num': self.__env.return_cursor(),
+                'buffer': self.__buffer.return_state()}
+
+    def load_checkpoint(self, checkpoint: dict) -> None:
+        """
+        Function to restore agent training state returned by return_checkpoint
+
+        :param checkpoint: dictionary of training state
+        :return: None
+        """
+
+        if checkpoint['columns'] != list(self.__schema.return_columns()):
+            raise ValueError('Checkpoint was made on dataset with another columns layout')
+
+        self.__q_network.load_state_dict(checkpoint['q_network'])
+        self.__target_network.load_state_dict(checkpoint['target_network'])
+        self.__optimizer.load_state_dict(checkpoint['optimizer'])
+        self.__env_steps = checkpoint['env_steps']
+        self.__optimizer_steps = checkpoint['optimizer_steps']
+        self.__env.set_cursor(checkpoint['case_num'])
+        self.__buffer.load_state(checkpoint['buffer'])
+
     def return_predict(self, state: list or np.array) -> int:
         """
         Function to return predict by agent for input state
@@ -144,7 +504,25 @@ class Agent:
         :return: action
         """
 
-        return [column.replace('_dinam_control', '') for column in self.return_dataset().columns if column.endswith('_dinam_control')][self.__q_network.predict(state)]
+        return self.__schema.return_action_names()[self.__q_network.predict(state)]
+
+    def return_schema(self) -> DatasetSchema:
+        """
+        Function to return columns layout of agent dataset
+
+        :return: dataset schema
+        """
+
+        return self.__schema
+
+    def return_dataset_object(self) -> Dataset:
+        """
+        Function to return agent dataset object
+
+        :return: dataset object
+        """
+
+        return self.__env.return_dataset()
 
     def return_dataset(self) -> pd.DataFrame:
         """
@@ -1,16 +1,29 @@
 from tkinter import *
 import tkinter as tk
+import shutil
 import threading
 from tkinter.ttk import Style
 from tkinter.ttk import Combobox
 from tkinter import messagebox
 from os import listdir
-from os.path import isfile, join
-from contextlib import contextmanager
+from os.path import isfile, join, dirname, abspath, basename
 from PIL import Image, ImageTk
 
-from DQN import dqn
-from Dataset import Dataset
+from BackgroundLoader import BackgroundLoader
+from ProgressBridge import ProgressBridge, REFRESH_MS
+
+# Training modules (torch, pandas, gym) imported in background while file is chosen
+HEAVY_MODULES = ('torch', 'pandas', 'gym', 'Dataset', 'Agent', 'DQN', 'ConvergenceMonitor', 'ModelCache',
+                 'Checkpoint', 'TrainingProcess', 'JobScheduler')
+
+# Torch threads of every scheduled training job (jobs run at once = cores // JOB_THREADS)
+JOB_THREADS = 1
+
+# Early stopping of Preloader training by TD loss (all episodes by default)
+EARLY_STOPPING = False
+
+# Training backend of Preloader: 'process' (child process, UI keeps GIL) or 'thread'
+TRAINING_BACKEND = 'process'
 
 
 class MyApp(tk.Tk):
@@ -20,6 +33,21 @@ class MyApp(tk.Tk):
 
         self.__files_path = files_path
 
+        # Heavy modules are imported while first page is shown
+        self.__loader = BackgroundLoader(HEAVY_MODULES)
+
+        # Cache of trained agents next to files folder (created after heavy modules are loaded)
+        self.__cache = None
+
+        # Scheduler of background training jobs (created with first job)
+        self.__scheduler = None
+
+        # Files being trained by Preloader or jobs (created after heavy modules are loaded)
+        self.__registry = None
+
+        # Checkpoints of unfinished trainings
+        self.__checkpoints_path = join(dirname(abspath(files_path)), 'Models', 'checkpoints')
+
         self.geometry(f'{width}x{height}')
         self.resizable(False, False)
         self.title(title)
@@ -31,20 +59,46 @@ class MyApp(tk.Tk):
         self.__frame = None
         self.switch_frame(ChooseFilePage)
 
-    def switch_frame(self, frame_class, chosen_file=None, agent=None):
+    def switch_frame(self, frame_class, chosen_file=None, agent=None, chosen_files=None):
         if self.__frame is not None:
             self.__frame.destroy()
 
         if frame_class == ChooseFilePage:
             new_frame = frame_class(self, self.__files_path)
         elif frame_class == Preloader:
+            self.__loader.wait()
+
             try:
-                new_frame = frame_class(self, chosen_file)
+                from DQN import CONFIG
+                from Dataset import Dataset
+
+                file_path = f'{self.__files_path}/{chosen_file}'
+                dataset = Dataset(file_path)
+                cache_key = self.get_cache().key(file_path, CONFIG)
+                agent = self.get_cache().load(cache_key, dataset)
+
+                if agent is not None:
+                    new_frame = PredictorPage(self, agent)
+                elif not self.get_registry().try_acquire(file_path):
+                    # Same file is trained by job, its agent is cached when job is finished
+                    messagebox.showinfo("Notification", "This file is already training in jobs. Open it from jobs "
+                                                        "list when it is finished")
+                    new_frame = ChooseFilePage(self, self.__files_path)
+                else:
+                    try:
+                        new_frame = frame_class(self, dataset, cache_key, file_path)
+                    except:
+                        self.get_registry().release(file_path)
+                        raise
             except:
                 messagebox.showinfo("Notification", "Not valid file. Try another one")
                 new_frame = ChooseFilePage(self, self.__files_path)
         elif frame_class == PredictorPage:
             new_frame = frame_class(self, agent)
+        elif frame_class == JobsPage:
+            for file_name in chosen_files or []:
+                self.get_scheduler().submit(f'{self.__files_path}/{file_name}')
+            new_frame = frame_class(self, self.get_scheduler())
         else:
             new_frame = frame_class(self)
 
@@ -55,6 +109,43 @@ class MyApp(tk.Tk):
 
         return self.__files_path
 
+    def get_cache(self):
+
+        if self.__cache is None:
+            self.__loader.wait()
+
+            from ModelCache import ModelCache
+            self.__cache = ModelCache(join(dirname(abspath(self.__files_path)), 'Models'))
+
+        return self.__cache
+
+    def get_checkpoints_path(self):
+
+        return self.__checkpoints_path
+
+    def get_scheduler(self):
+
+        if self.__scheduler is None:
+            from JobScheduler import JobScheduler
+            self.__scheduler = JobScheduler(self.get_cache(), self.__checkpoints_path, threads=JOB_THREADS,
+                                            registry=self.get_registry())
+
+        return self.__scheduler
+
+    def get_registry(self):
+
+        if self.__registry is None:
+            self.__loader.wait()
+
+            from JobScheduler import TrainingRegistry
+            self.__registry = TrainingRegistry()
+
+        return self.__registry
+
+    def has_jobs(self):
+
+        return self.__scheduler is not None and len(self.__scheduler.jobs()) > 0
+
 
 class ChooseFilePage(tk.Frame):
 
@@ -69,33 +160,67 @@ class ChooseFilePage(tk.Frame):
         Label(self, text="Choose file with COVID-19 patients data", font=("Arial Bold", 30)).pack()
         Label(self, text=f'(File must be in path: "{files_path}" and be .pkl)', font=("Arial", 10, 'italic')).pack()
 
+        files = [f for f in listdir(self.__files_path) if isfile(join(self.__files_path, f)) and f.endswith('.pkl')]
+
         combo = Combobox(self, width=25, state='readonly', background=self.cget('background'),
-                         font=("Arial", 13),
-                         values=[f for f in listdir(self.__files_path) if
-                                 isfile(join(self.__files_path, f)) and f.endswith('.pkl')])
+                         font=("Arial", 13), values=files)
 
         button = Button(self, text="Choose", width=20, height=1, background='#ff5858', font=("Arial Bold", 15),
                         fg='white', command=lambda: parent.switch_frame(Preloader, chosen_file=combo.get()))
 
-        if len(listdir(self.__files_path)) > 0:
+        # Trainings in background, several files at once
+        jobs_group = LabelFrame(self, borderwidth=0)
+
+        add_button = Button(jobs_group, text="Add to jobs", width=15, height=1, font=("Arial Bold", 12),
+                            command=lambda: parent.switch_frame(JobsPage, chosen_files=[combo.get()]))
+        add_all_button = Button(jobs_group, text="Add all to jobs", width=15, height=1, font=("Arial Bold", 12),
+                                command=lambda: parent.switch_frame(JobsPage, chosen_files=files))
+        jobs_button = Button(jobs_group, text="Jobs", width=15, height=1, font=("Arial Bold", 12),
+                             command=lambda: parent.switch_frame(JobsPage))
+
+        if len(files) > 0:
             combo.current(0)
         else:
-            button.configure(state='disabled')
+            for disabled_button in (button, add_button, add_all_button):
+                disabled_button.configure(state='disabled')
+
+        if not parent.has_jobs():
+            jobs_button.configure(state='disabled')
 
         combo.pack(pady=20)
         button.pack()
 
+        jobs_group.pack(pady=20)
+        add_button.pack(side=tk.LEFT, padx=5)
+        add_all_button.pack(side=tk.LEFT, padx=5)
+        jobs_button.pack(side=tk.LEFT, padx=5)
+
 
 class Preloader(tk.Frame):
 
-    def __init__(self, parent, chosen_file):
+    def __init__(self, parent, dataset, cache_key, file_path):
         tk.Frame.__init__(self, parent)
 
         self.__parent = parent
 
-        self.__chosen_file = chosen_file
+        self.__dataset = dataset
+
+        self.__cache_key = cache_key
+
+        self.__file_path = file_path
 
-        self.__dataset = Dataset(f'{parent.get_file_path()}/{chosen_file}')
+        self.__checkpoints_directory = join(parent.get_checkpoints_path(), cache_key)
+
+        # Checkpoints of process backend are written by training process, writer thread is needed by thread backend
+        if TRAINING_BACKEND == 'process':
+            self.__checkpointer = None
+        else:
+            from Checkpoint import Checkpointer
+            self.__checkpointer = Checkpointer(self.__checkpoints_directory, every_episodes=100, every_seconds=60)
+
+        # Cancellation of thread backend and training process of process backend
+        self.__cancel = threading.Event()
+        self.__process = None
 
         Label(self, text='Loading dataset and training agent...', font=("Arial Bold", 15)).pack(
             fill=tk.BOTH, side=tk.TOP, expand=True, pady=10)
@@ -122,26 +247,110 @@ class Preloader(tk.Frame):
         self.__progress = Label(self, text=f'Episode 1 from {self.__dataset.episodes_count()}')
         self.__progress.pack(pady=30)
 
-        self.thread = threading.Thread(target=self.context_call)
+        self.__cancel_button = Button(self, text="Cancel", width=20, height=1, font=("Arial Bold", 12),
+                                      command=self.cancel)
+        self.__cancel_button.pack()
+
+        # Training thread posts events, main loop shows them at fixed refresh rate
+        self.__bridge = ProgressBridge(self, self.on_event)
+        self.__bridge.start()
+
+        self.thread = threading.Thread(target=self.train, daemon=True)
         self.thread.start()
 
-    def context_call(self):
-        with self.start_dqn() as context:
-            self.destroy()
-            self.__parent.switch_frame(PredictorPage, agent=context)
+    def train(self):
+        # Training thread makes no Tk calls, everything goes through bridge
+        from DQN import CONFIG
 
-    @contextmanager
-    def start_dqn(self):
-        gen = dqn(self.__dataset)
-        all_iters = self.__dataset.episodes_count()
+        try:
+            agent = self.train_in_process() if TRAINING_BACKEND == 'process' else self.train_in_thread()
+
+            if agent is None:
+                self.__bridge.post({'cancelled': True}, coalesce=False)
+                return
+
+            self.__parent.get_cache().save(self.__cache_key, agent, CONFIG)
+            if self.__checkpointer is None:
+                shutil.rmtree(self.__checkpoints_directory, ignore_errors=True)
+            else:
+                self.__checkpointer.clear()
+        except Exception as error:
+            self.__bridge.post({'error': error}, coalesce=False)
+        else:
+            self.__bridge.post({'finished': True, 'agent': agent}, coalesce=False)
+        finally:
+            # Jobs of same file wait until here
+            self.__parent.get_registry().release(self.__file_path)
+
+    def train_in_thread(self):
+        from ConvergenceMonitor import ConvergenceMonitor
+        from DQN import dqn, CONFIG
+
+        gen = dqn(self.__dataset, CONFIG, monitor=ConvergenceMonitor() if EARLY_STOPPING else None,
+                  checkpointer=self.__checkpointer, resume=True)
         while True:
+            if self.__cancel.is_set():
+                gen.close()
+                self.__checkpointer.wait()
+                return None
+
             try:
                 value = next(gen)
-                self.__progress.configure(text=f'Episode {value} from {all_iters}')
             except StopIteration as e:
-                result = e.value
-                break
-        yield result
+                return e.value
+
+            self.__bridge.post(value, coalesce=not value.get('stopped'))
+
+    def train_in_process(self):
+        # This thread only waits on pipe, GIL stays with main loop
+        from DQN import CONFIG
+        from TrainingProcess import TrainingProcess, rebuild_agent
+
+        self.__process = TrainingProcess(self.__file_path, CONFIG, self.__checkpoints_directory,
+                                         early_stopping=EARLY_STOPPING)
+        if self.__cancel.is_set():
+            self.__process.cancel()
+
+        for event in self.__process.events():
+            if 'error' in event:
+                raise RuntimeError(event['error'])
+            elif event.get('cancelled'):
+                return None
+            elif event.get('finished'):
+                return rebuild_agent(self.__dataset, event['state_dict'], event['schema'], CONFIG)
+
+            self.__bridge.post(event, coalesce=not event.get('stopped'))
+
+    def cancel(self):
+        self.__cancel_button.configure(state='disabled')
+        self.__progress.configure(text='Cancelling...')
+
+        self.__cancel.set()
+        if self.__process is not None:
+            self.__process.cancel()
+
+    def on_event(self, event):
+        all_iters = self.__dataset.episodes_count()
+
+        if 'error' in event:
+            self.__bridge.stop()
+            messagebox.showinfo("Notification", f"Training failed: {event['error']}")
+            self.__parent.switch_frame(ChooseFilePage)
+        elif event.get('cancelled'):
+            self.__bridge.stop()
+            self.__parent.switch_frame(ChooseFilePage)
+        elif event.get('finished'):
+            # Hand-off to predictor page on main thread
+            self.__bridge.stop()
+            self.__parent.switch_frame(PredictorPage, agent=event['agent'])
+        elif self.__cancel.is_set():
+            return
+        elif event.get('stopped'):
+            self.__progress.configure(text=f'Stopped at {event["episode"]} from {all_iters}: {event["reason"]}')
+        else:
+            eta = '--:--' if event['eta'] is None else '{:02d}:{:02d}'.format(*divmod(int(event['eta']), 60))
+            self.__progress.configure(text=f'Episode {event["episode"]} from {all_iters}\n'
+                                           f'{event["rows_per_second"]:.0f} rows/s, ETA {eta}')
 
     def animate(self):
         self.current_frame += 1
@@ -154,20 +363,92 @@ class Preloader(tk.Frame):
         self.__parent.after(50, self.animate)
 
 
+class JobsPage(tk.Frame):
+
+    def __init__(self, parent, scheduler):
+        tk.Frame.__init__(self, parent)
+
+        self.__parent = parent
+
+        self.__scheduler = scheduler
+
+        Label(self, text="Training jobs", font=("Arial Bold", 30)).pack()
+        Label(self, text=f'({scheduler.workers()} jobs run at once)', font=("Arial", 10, 'italic')).pack()
+
+        self.__jobs_group = LabelFrame(self, borderwidth=0)
+        self.__jobs_group.pack(pady=20)
+
+        # Widgets of every job by number: status label, open and cancel buttons
+        self.__rows = {}
+
+        Button(self, text="Add files", width=20, height=1, background='#ff5858', font=("Arial Bold", 15),
+               fg='white', command=lambda: parent.switch_frame(ChooseFilePage)).pack(pady=10)
+
+        # Jobs state is read at UI refresh rate, training threads make no Tk calls
+        self.refresh()
+
+    def refresh(self):
+        # Polling stops with page
+        if not self.winfo_exists():
+            return
+
+        for job in self.__scheduler.jobs():
+            if job.return_number() not in self.__rows:
+                self.add_row(job)
+
+            status, open_button, cancel_button = self.__rows[job.return_number()]
+            status.configure(text=self.job_text(job))
+
+            open_button.configure(state='normal' if job.return_status() == 'finished' else 'disabled')
+            cancel_button.configure(state='normal' if job.return_status() in ('queued', 'running') else 'disabled')
+
+        self.after(REFRESH_MS, self.refresh)
+
+    def add_row(self, job):
+        row = len(self.__rows)
+
+        Label(self.__jobs_group, text=basename(job.return_file_path()), font=("Arial Bold", 12)).grid(
+            column=0, row=row, padx=10, pady=5, sticky=tk.W)
+
+        status = Label(self.__jobs_group, width=50, anchor=tk.W, font=("Arial", 11))
+        status.grid(column=1, row=row, padx=10, pady=5)
+
+        open_button = Button(self.__jobs_group, text="Open", width=10,
+                             command=lambda: self.__parent.switch_frame(PredictorPage, agent=job.return_agent()))
+        open_button.grid(column=2, row=row, padx=5, pady=5)
+
+        cancel_button = Button(self.__jobs_group, text="Cancel", width=10, command=job.cancel)
+        cancel_button.grid(column=3, row=row, padx=5, pady=5)
+
+        self.__rows[job.return_number()] = (status, open_button, cancel_button)
+
+    @staticmethod
+    def job_text(job):
+        progress = job.return_progress()
+
+        if job.return_status() == 'failed':
+            return f'Failed: {job.return_error()}'
+        elif job.return_status() != 'running' or progress is None:
+            return job.return_status().capitalize()
+
+        eta = '--:--' if progress['eta'] is None else '{:02d}:{:02d}'.format(*divmod(int(progress['eta']), 60))
+
+        return f'Episode {progress["episode"]} from {progress["episodes"]}, ' \
+               f'{progress["rows_per_second"]:.0f} rows/s, ETA {eta}'
+
+
 class PredictorPage(tk.Frame):
 
     def __init__(self, parent, agent):
         tk.Frame.__init__(self, parent)
 
         self.__agent = agent
-        self.__dataset = agent.return_dataset()
 
-        self.__stat_control = [column.replace('_stat_control', '') for column in self.__dataset.columns if
-                               column.endswith('_stat_control')]
-        self.__stat_fact = [column.replace('_stat_fact', '') for column in self.__dataset.columns if
-                            column.endswith('_stat_fact')]
-        self.__dinam_fact = [column.replace('_dinam_fact', '') for column in self.__dataset.columns if
-                             column.endswith('_dinam_fact')]
+        schema = agent.return_schema()
+
+        self.__stat_control = schema.return_group('stat_control', names=True)
+        self.__stat_fact = schema.return_group('stat_fact', names=True)
+        self.__dinam_fact = schema.return_group('dinam_fact', names=True)
 
         self.__stat_control_group = LabelFrame(self, text='Stat control parameters')
         self.__stat_control_group.pack(anchor=tk.W, pady=10)
@@ -207,6 +488,10 @@ class PredictorPage(tk.Frame):
         Button(self, text="Predict", width=20, height=1, background='#ff5858', font=("Arial Bold", 15),
                fg='white', command=lambda: self.predict()).pack(pady=10)
 
+        if parent.has_jobs():
+            Button(self, text="Back to jobs", width=20, height=1, font=("Arial Bold", 12),
+                   command=lambda: parent.switch_frame(JobsPage)).pack()
+
         self.__result = ''
         self.__result_label = Text(self, height=1, width=50, font=("Arial Bold", 15), background=self.cget('background'))
         self.__result_label.pack()
@@ -0,0 +1,58 @@
+import importlib
+import threading
+
+
+class BackgroundLoader:
+    """
+    Class of modules importer running in background thread while window is already shown
+    """
+
+    def __init__(self, modules: tuple) -> None:
+        """
+        Function to init loader and start importing
+
+        :param modules: names of modules to import
+        """
+
+        self.__modules = modules
+        self.__error = None
+
+        self.__done = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        """
+        Function of loader thread
+
+        :return: None
+        """
+
+        try:
+            for name in self.__modules:
+                importlib.import_module(name)
+        except Exception as error:
+            self.__error = error
+        finally:
+            self.__done.set()
+
+    def ready(self) -> bool:
+        """
+        Function to return are all modules imported
+
+        :return: imported or no
+        """
+
+        return self.__done.is_set()
+
+    def wait(self) -> None:
+        """
+        Function to wait for all modules and raise import error of loader thread
+
+        :return: None
+        """
+
+        self.__done.wait()
+
+        if self.__error is not None:
+            raise self.__error
@@ -0,0 +1,639 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import torch
+
+from Agent import Agent
+from Buffer import Buffer
+from PrioritizedBuffer import PrioritizedBuffer
+from SumTree import SumTree
+from Dataset import Dataset
+from DQN import dqn, offline_dqn, create_agent
+from ParallelCollector import parallel_dqn
+from Environment import Environment
+from RunningTracker import RunningTracker
+from ProgressBridge import ProgressBridge, REFRESH_MS
+from Predictor import Predictor
+from NumpyPredictor import NumpyPredictor
+from Export import export_torchscript, export_onnx, export_numpy
+
+
+def environment_parity(dataset: Dataset) -> bool:
+    """
+    Function to check that array environment returns the same episodes as pandas lookups by case
+
+    :param dataset: dataset object
+    :return: True if all states, rewards and dones are equal
+    """
+
+    # Pandas reference
+    lines = dataset.return_dataset()
+    states = dataset.return_states_and_actions()[0]
+
+    env = Environment(dataset)
+
+    for case in lines.index.unique():
+        case_lines = lines.loc[[case]]
+        case_states = states.loc[[case]]
+
+        state = env.reset()
+        if not np.array_equal(state, case_states.iloc[0].to_numpy(dtype=np.float32)):
+            return False
+
+        step = 0
+        done = False
+        while not done:
+            line = case_lines.iloc[step]
+            expected_done = line.end_epizode
+            expected_reward = -100 * line.outcome_tar - line.current_process_duration + 100
+            if not expected_done:
+                step += 1
+
+            next_state, reward, done = env.step(0)
+            if reward != expected_reward or done != expected_done or \
+                    not np.array_equal(next_state, case_states.iloc[step].to_numpy(dtype=np.float32)):
+                return False
+
+    return True
+
+
+def transitions_parity(dataset: Dataset) -> bool:
+    """
+    Function to check that transitions of array environment are the same as pandas lookups by case
+
+    :param dataset: dataset object
+    :return: True if all states, actions, rewards, next states and dones are equal
+    """
+
+    # Pandas reference
+    lines = dataset.return_dataset()
+    states, actions = dataset.return_states_and_actions()
+
+    expected = []
+    for case in lines.index.unique():
+        case_lines = lines.loc[[case]]
+        case_states = states.loc[[case]].to_numpy(dtype=np.float32)
+        for step in range(len(case_lines)):
+            line = case_lines.iloc[step]
+            next_step = step if line.end_epizode or step + 1 == len(case_lines) else step + 1
+            expected.append((case_states[step], int(np.argmax(actions.loc[[case]].iloc[step].to_numpy())),
+                             -100 * line.outcome_tar - line.current_process_duration + 100, case_states[next_step],
+                             line.end_epizode))
+
+    transitions = Environment(dataset).return_transitions()
+
+    return len(transitions[0]) == len(expected) and \
+        all(np.array_equal(array, np.array(values, dtype=array.dtype))
+            for array, values in zip(transitions, zip(*expected)))
+
+
+def synthetic_frame(cases: int = 30, seed: int = 0) -> pd.DataFrame:
+    """
+    Function to return raw dataframe like patients data: cases of several lengths in shuffled order, missing values in
+    some lines and a column missing in whole case
+
+    :param cases: count of cases
+    :param seed: random seed
+    :return: raw dataframe indexed by case
+    """
+
+    rng = np.random.default_rng(seed)
+    lines = []
+
+    for case in range(cases):
+        length = 1 + case % 7
+        outcome = float(rng.integers(0, 2))
+        static = rng.normal(size=2)
+        for t_point in range(length):
+            action = rng.integers(0, 3)
+            line = {'case': case, 't_point': float(t_point), 'current_process_duration': t_point * rng.random(),
+                    'long_observation_tar': float(rng.integers(0, 2)), 'age_stat_fact': static[0],
+                    'weight_stat_control': static[1], 'end_epizode': float(t_point == length - 1),
+                    'outcome_tar': outcome}
+            for column in ('temperature', 'pressure', 'saturation'):
+                line[f'{column}_dinam_fact'] = np.nan if rng.random() < 0.2 else rng.normal()
+            for drug in range(3):
+                line[f'drug{drug}_dinam_control'] = float(drug == action)
+            lines.append(line)
+
+    frame = pd.DataFrame(lines).set_index('case')
+
+    # Column missing in whole case (its lines are dropped by preprocessing)
+    frame.loc[cases - 1, 'pressure_dinam_fact'] = np.nan
+
+    return frame.sample(frac=1, random_state=seed)
+
+
+def synthetic_parity() -> bool:
+    """
+    Function to check environment parity on synthetic dataset written to temporary pickle (no data file is needed)
+
+    :return: True if steps and transitions are equal to pandas lookups
+    """
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'synthetic.pkl')
+        synthetic_frame().to_pickle(file_path)
+
+        # Preprocessed and cached dataset (cache is read back) must give the same environment
+        datasets = (Dataset(file_path), Dataset(file_path), Dataset(file_path, cache=False))
+
+        return all(environment_parity(dataset) and transitions_parity(dataset) for dataset in datasets)
+
+
+def environment_steps(dataset: Dataset) -> float:
+    """
+    Function to measure environment steps per second over all cases
+
+    :param dataset: dataset object
+    :return: steps per second
+    """
+
+    env = Environment(dataset)
+    steps = 0
+
+    start_time = time.perf_counter()
+    for _ in range(dataset.episodes_count()):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done = env.step(0)
+            steps += 1
+
+    return steps / (time.perf_counter() - start_time)
+
+
+def buffer_sampling(size: int = 1000000, state_dim: int = 64, batch_size: int = 64, repeats: int = 1000,
+                    buffer_class: type = Buffer) -> float:
+    """
+    Function to measure buffer sampling time
+
+    :param size: count of elements in buffer
+    :param state_dim: dimensional of states
+    :param batch_size: batch size
+    :param repeats: count of samples
+    :param buffer_class: Buffer or PrioritizedBuffer
+    :return: mean time of one sample in microseconds
+    """
+
+    buffer = buffer_class(size, state_dim)
+    states = np.zeros((size, state_dim), dtype=np.float32)
+    buffer.add_batch(states, np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.float32), states,
+                     np.zeros(size, dtype=np.float32))
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        buffer.sample(batch_size)
+
+    return (time.perf_counter() - start_time) / repeats * 1e6
+
+
+def prioritized_sampling(size: int = 1000000, state_dim: int = 32, repeats: int = 1000) -> dict:
+    """
+    Function to measure sampling and priorities update time of prioritized buffer against uniform buffer
+
+    :param size: count of elements in buffer
+    :param state_dim: dimensional of states
+    :param repeats: count of samples
+    :return: dictionary of microseconds by batch size (uniform sample, prioritized sample, priorities update)
+    """
+
+    results = {}
+
+    for batch_size in (64, 256, 1024):
+        tree = SumTree(size)
+        tree.update(np.arange(size), np.ones(size))
+        indices = np.random.randint(size, size=batch_size)
+        priorities = np.random.random(batch_size)
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            tree.update(indices, priorities)
+        update_time = (time.perf_counter() - start_time) / repeats * 1e6
+
+        results[batch_size] = (buffer_sampling(size, state_dim, batch_size, repeats),
+                               buffer_sampling(size, state_dim, batch_size, repeats, PrioritizedBuffer),
+                               update_time)
+
+    return results
+
+
+def buffer_prefill(dataset: Dataset) -> float:
+    """
+    Function to measure time of filling agent buffer by whole dataset
+
+    :param dataset: dataset object
+    :return: time in seconds
+    """
+
+    agent = Agent(Environment(dataset), buffer_size=dataset.size())
+
+    start_time = time.perf_counter()
+    agent.prefill_from_dataset()
+
+    return time.perf_counter() - start_time
+
+
+def bellman_error(agent: Agent, gamma: float = 0.99) -> float:
+    """
+    Function to compute mean squared Bellman error of agent over all logged transitions
+
+    :param agent: trained agent
+    :param gamma: gamma
+    :return: mean squared error
+    """
+
+    env = Environment(agent.return_dataset_object())
+    states, actions, rewards, next_states, dones = [torch.as_tensor(array) for array in env.return_transitions()]
+
+    with torch.no_grad():
+        q_network = agent.return_q_network()
+        q_values = q_network.forward(states).gather(1, actions.unsqueeze(1)).squeeze(1)
+        target_q_values = rewards + gamma * q_network.forward(next_states).max(1)[0] * (1 - dones)
+
+    return torch.mean((q_values - target_q_values) ** 2).item()
+
+
+def return_error(agent: Agent, gamma: float = 0.99) -> float:
+    """
+    Function to compute mean squared error of agent Q values of logged actions against discounted returns of logged
+    episodes (rewards do not depend on action, so returns are targets of any policy)
+
+    :param agent: agent
+    :param gamma: gamma
+    :return: mean squared error
+    """
+
+    env = Environment(agent.return_dataset_object())
+    states, actions, rewards, _, dones = env.return_transitions()
+
+    # Discounted returns from the end of dataset backwards, restarted at every done
+    returns = np.zeros(len(rewards))
+    future = 0.0
+    for row in range(len(rewards) - 1, -1, -1):
+        future = rewards[row] + (0.0 if dones[row] else gamma * future)
+        returns[row] = future
+
+    q_values = agent.return_q_network().q_values(states)[np.arange(len(actions)), actions]
+
+    return float(np.mean((q_values - returns) ** 2))
+
+
+def training(dataset: Dataset, trainer, **kwargs) -> tuple[float, float, float, float, float]:
+    """
+    Function to measure training generator wall time, mean TD loss of first and last tenth of training, final
+    Bellman error and final error against discounted returns
+
+    :param dataset: dataset object
+    :param trainer: training generator function (dqn or offline_dqn)
+    :return: tuple of (seconds, first TD loss, last TD loss, Bellman error, return error)
+    """
+
+    start_time = time.perf_counter()
+    losses = []
+
+    gen = trainer(dataset, **kwargs)
+    while True:
+        try:
+            value = next(gen)
+        except StopIteration as e:
+            agent = e.value
+            break
+
+        if value.get('loss') is not None:
+            losses.append(value['loss'])
+
+    seconds = time.perf_counter() - start_time
+
+    # Mean losses of first and last tenth of training (single TD losses are noisy)
+    window = max(1, len(losses) // 10)
+    first_loss = float(np.mean(losses[:window])) if losses else float('nan')
+    last_loss = float(np.mean(losses[-window:])) if losses else float('nan')
+
+    return seconds, first_loss, last_loss, bellman_error(agent), return_error(agent)
+
+
+def tracker_overhead(dataset: Dataset, repeats: int = 3) -> dict:
+    """
+    Function to compare dqn wall time with disabled and enabled tracker
+
+    :param dataset: dataset object
+    :param repeats: count of runs for every variant (best is taken)
+    :return: dictionary of seconds by variant
+    """
+
+    variants = {'disabled': lambda: RunningTracker(enabled=False), 'enabled': lambda: RunningTracker(enabled=True)}
+
+    return {name: min(training(dataset, dqn, tracker=create())[0] for _ in range(repeats))
+            for name, create in variants.items()}
+
+
+def bridge_overhead(dataset: Dataset, repeats: int = 3) -> tuple[float, float]:
+    """
+    Function to compare headless dqn wall time with dqn posting every episode to progress bridge drained at UI
+    refresh rate by other thread
+
+    :param dataset: dataset object
+    :param repeats: count of runs for every variant (best is taken)
+    :return: tuple of (headless seconds, bridge attached seconds)
+    """
+
+    def attached() -> float:
+        bridge = ProgressBridge(None, None)
+        finished = threading.Event()
+
+        # Stand-in of Tk main loop draining events at refresh rate
+        def consumer() -> None:
+            while not finished.wait(REFRESH_MS / 1000):
+                bridge.drain()
+
+        thread = threading.Thread(target=consumer)
+        thread.start()
+
+        start_time = time.perf_counter()
+        for value in dqn(dataset):
+            bridge.post(value, coalesce=not value.get('stopped'))
+        seconds = time.perf_counter() - start_time
+
+        finished.set()
+        thread.join()
+
+        return seconds
+
+    headless = min(training(dataset, dqn)[0] for _ in range(repeats))
+
+    return headless, min(attached() for _ in range(repeats))
+
+
+def inference_latency(model_path: str, batch_size: int = 1024, repeats: int = 1000, rtol: float = 1e-5,
+                      atol: float = 1e-5) -> dict:
+    """
+    Function to measure single-sample and batched latency of eager, TorchScript, NumPy (and ONNX Runtime if
+    installed) Q values of saved agent and their max relative difference from eager
+
+    :param model_path: path to saved agent
+    :param batch_size: size of batch
+    :param repeats: count of calls for every measure (median is taken)
+    :param rtol: relative tolerance of parity (float32 rounding grows with Q values)
+    :param atol: absolute tolerance of parity for Q values near zero
+    :return: dictionary by backend of (single-sample us, batch us, max relative difference, parity)
+    """
+
+    import tempfile
+
+    predictor = Predictor(model_path)
+    state_dim = predictor.return_schema().state_dim()
+    single = np.random.rand(1, state_dim).astype(np.float32)
+    batch = np.random.rand(batch_size, state_dim).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        export_torchscript(predictor, os.path.join(directory, 'model.ts.pt'))
+        export_numpy(predictor, os.path.join(directory, 'model.npz'))
+
+        scripted = torch.jit.load(os.path.join(directory, 'model.ts.pt'))
+        numpy_predictor = NumpyPredictor(os.path.join(directory, 'model.npz'))
+
+        def torchscript(states: np.ndarray) -> np.ndarray:
+            with torch.no_grad():
+                return scripted(torch.from_numpy(states)).numpy()
+
+        backends = {'eager': predictor.return_q_network().q_values, 'torchscript': torchscript,
+                    'numpy': numpy_predictor.q_values}
+
+        # ONNX Runtime is optional
+        try:
+            import onnxruntime
+
+            export_onnx(predictor, os.path.join(directory, 'model.onnx'))
+            session = onnxruntime.InferenceSession(os.path.join(directory, 'model.onnx'))
+            backends['onnx'] = lambda states: session.run(None, {'states': states})[0]
+        except ImportError:
+            pass
+
+        def latency(function, states: np.ndarray) -> float:
+            times = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                function(states)
+                times.append(time.perf_counter() - start_time)
+            return float(np.median(times)) * 1e6
+
+        reference = backends['eager'](batch)
+        results = {}
+
+        for name, function in backends.items():
+            output = function(batch)
+            difference = float((np.abs(output - reference) / np.maximum(np.abs(reference), atol)).max())
+            results[name] = (latency(function, single), latency(function, batch), difference,
+                             bool(np.allclose(output, reference, rtol=rtol, atol=atol)))
+
+    return results
+
+
+def import_time(module: str = 'Application', heavy_modules: tuple = ('torch', 'pandas', 'gym', 'matplotlib')) -> \
+        tuple[float, list]:
+    """
+    Function to measure cold import time of module by -X importtime in new interpreter
+
+    :param module: name of module
+    :param heavy_modules: modules which must not be imported by module
+    :return: tuple of (cumulative milliseconds, imported heavy modules)
+    """
+
+    code = f'import sys, {module}; print(",".join(name for name in {heavy_modules!r} if name in sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    # Lines of stderr are "import time: self [us] | cumulative | imported package"
+    cumulative = [int(line.split('|')[1]) for line in result.stderr.splitlines()
+                  if line.startswith('import time:') and line.split('|')[-1].strip() == module]
+
+    return cumulative[0] / 1000, [name for name in result.stdout.strip().split(',') if name]
+
+
+def collection_scaling(file_path: str, workers_counts: tuple = (1, 2, 4, 8)) -> dict:
+    """
+    Function to measure rows per second of parallel_dqn by count of collecting workers
+
+    :param file_path: path to dataset file
+    :param workers_counts: counts of workers
+    :return: dictionary of rows per second by count of workers
+    """
+
+    rows = Dataset(file_path).size()
+    results = {}
+
+    for workers in workers_counts:
+        start_time = time.perf_counter()
+        for _ in parallel_dqn(file_path, workers=workers):
+            pass
+        results[workers] = rows / (time.perf_counter() - start_time)
+
+    return results
+
+
+def server_load(url: str, state_dim: int, clients: int = 16, requests_count: int = 200) -> dict:
+    """
+    Function to generate load of concurrent single-state requests on prediction server
+
+    :param url: server url (http://127.0.0.1:8000)
+    :param state_dim: state dimensional of served agent
+    :param clients: count of concurrent clients
+    :param requests_count: count of requests of every client
+    :return: server statistics with requests per second
+    """
+
+    body = json.dumps({'state': [0.0] * state_dim}).encode()
+
+    def client():
+        for _ in range(requests_count):
+            request = urllib.request.Request(f'{url}/predict', data=body, headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(request).read()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    with urllib.request.urlopen(f'{url}/stats') as response:
+        stats = json.loads(response.read())
+
+    return {'requests_per_second': clients * requests_count / elapsed, **stats}
+
+
+def main() -> None:
+    """
+    Function of benchmarks command line
+
+    :return: None
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmarks of training and prediction')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    dataset_parser = subparsers.add_parser('dataset', help='environment parity, buffer and training benchmarks, '
+                                                           'fails if training diverges')
+    dataset_parser.add_argument('file', help='.pkl file with patients data')
+
+    parity_parser = subparsers.add_parser('parity', help='check array environment against pandas lookups, fails on '
+                                                         'mismatch')
+    parity_parser.add_argument('file', nargs='?', default=None, help='.pkl file with patients data (synthetic '
+                                                                      'dataset if not set)')
+
+    subparsers.add_parser('replay', help='uniform and prioritized sampling of 64, 256 and 1024 from 1M elements')
+
+    telemetry_parser = subparsers.add_parser('telemetry', help='dqn wall time with disabled and enabled tracker')
+    telemetry_parser.add_argument('file', help='.pkl file with patients data')
+
+    bridge_parser = subparsers.add_parser('bridge', help='dqn wall time headless and with progress bridge attached')
+    bridge_parser.add_argument('file', help='.pkl file with patients data')
+
+    inference_parser = subparsers.add_parser('inference', help='latency and parity of eager, TorchScript and NumPy '
+                                                               'predicts, fails if parity is broken')
+    inference_parser.add_argument('model', help='saved agent')
+    inference_parser.add_argument('--batch-size', type=int, default=1024, help='size of batch')
+
+    startup_parser = subparsers.add_parser('startup', help='import time of Application, fails over budget or if '
+                                                           'training modules are imported')
+    startup_parser.add_argument('--budget-ms', type=float, default=500, help='import time budget in milliseconds')
+
+    scaling_parser = subparsers.add_parser('scaling', help='parallel collection rows/s for 1, 2, 4 and 8 workers')
+    scaling_parser.add_argument('file', help='.pkl file with patients data')
+
+    server_parser = subparsers.add_parser('server', help='load generator for running prediction server')
+    server_parser.add_argument('url', help='server url, for example http://127.0.0.1:8000')
+    server_parser.add_argument('state_dim', type=int, help='state dimensional of served agent')
+    server_parser.add_argument('--clients', type=int, default=16, help='count of concurrent clients')
+    server_parser.add_argument('--requests', type=int, default=200, help='count of requests of every client')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'dataset':
+        data = Dataset(args.file)
+
+        parity = environment_parity(data)
+        print(f'Environment parity: {parity}')
+
+        # Timings of broken environment are meaningless
+        if not parity:
+            sys.exit(1)
+
+        print(f'Environment steps/s: {environment_steps(data):.0f}')
+        print(f'Buffer prefill: {buffer_prefill(data):.3f} s')
+        print(f'Buffer sample of 64 from 100000: {buffer_sampling(100000, data.state_dim()):.1f} us')
+
+        # TD loss of zero Q values is only the squared reward, it grows with Q values even if training converges
+        # (end of episode is not seen in states), so convergence is checked by loss against discounted returns
+        untrained = create_agent(data)
+        initial_loss = return_error(untrained)
+        print(f'Untrained: Bellman error {bellman_error(untrained):.4f}, return loss {initial_loss:.4f}')
+
+        converged = True
+        for name, trainer in (('dqn', dqn), ('offline_dqn', offline_dqn)):
+            seconds, first_loss, last_loss, error, final_loss = training(data, trainer)
+            print(f'{name}: {seconds:.2f} s, TD loss {first_loss:.4f} -> {last_loss:.4f}, Bellman error {error:.4f}, '
+                  f'return loss {initial_loss:.4f} -> {final_loss:.4f}')
+            converged = converged and final_loss <= initial_loss
+
+        # Training which ends with worse Q values than untrained network diverges
+        if not converged:
+            sys.exit(1)
+    elif args.benchmark == 'parity':
+        if args.file is None:
+            parity = synthetic_parity()
+        else:
+            data = Dataset(args.file)
+            parity = environment_parity(data) and transitions_parity(data)
+        print(f'Environment parity: {parity}')
+
+        if not parity:
+            sys.exit(1)
+    elif args.benchmark == 'replay':
+        for batch_size, (uniform, prioritized, update) in prioritized_sampling().items():
+            print(f'Batch {batch_size}: uniform sample {uniform:.0f} us, prioritized sample {prioritized:.0f} us, '
+                  f'priorities update {update:.0f} us')
+    elif args.benchmark == 'telemetry':
+        for name, seconds in tracker_overhead(Dataset(args.file)).items():
+            print(f'Tracker {name}: {seconds:.2f} s')
+    elif args.benchmark == 'bridge':
+        headless, attached = bridge_overhead(Dataset(args.file))
+        print(f'Headless: {headless:.2f} s, bridge attached: {attached:.2f} s '
+              f'({(attached / headless - 1) * 100:+.1f} %)')
+    elif args.benchmark == 'inference':
+        results = inference_latency(args.model, args.batch_size)
+        for name, (single, batched, difference, parity) in results.items():
+            print(f'{name}: single {single:.1f} us, batch of {args.batch_size} {batched:.1f} us, '
+                  f'max relative difference {difference:.2e}, parity {parity}')
+
+        if not all(parity for *_, parity in results.values()):
+            sys.exit(1)
+    elif args.benchmark == 'startup':
+        milliseconds, heavy = import_time()
+        print(f'Application import: {milliseconds:.0f} ms (budget {args.budget_ms:.0f} ms), '
+              f'heavy modules: {", ".join(heavy) or "none"}')
+
+        if milliseconds > args.budget_ms or heavy:
+            sys.exit(1)
+    elif args.benchmark == 'scaling':
+        for workers, rows_per_second in collection_scaling(args.file).items():
+            print(f'{workers} workers: {rows_per_second:.0f} rows/s')
+    elif args.benchmark == 'server':
+        print(server_load(args.url, args.state_dim, args.clients, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,54 @@
-import random
 import numpy as np
-from collections import deque
+import torch
+
+from RunningTracker import RunningTracker
 
 
 class Buffer:
     """
-    Class of model experience buffer
+    Class of model experience buffer (preallocated ring of numpy arrays)
     """
 
-    def __init__(self, max_size: int) -> None:
+    def __init__(self, max_size: int, state_dim: int) -> None:
         """
         Function to init buffer
 
         :param max_size: maximum size of buffer
+        :param state_dim: dimensional of states
         """
 
         self.__max_size = max_size
-        self.__buffer = deque(maxlen=max_size)
+        self.__state_dim = state_dim
+
+        # Preallocated storage
+        self.__states = np.zeros((max_size, state_dim), dtype=np.float32)
+        self.__actions = np.zeros(max_size, dtype=np.int64)
+        self.__rewards = np.zeros(max_size, dtype=np.float32)
+        self.__next_states = np.zeros((max_size, state_dim), dtype=np.float32)
+        self.__dones = np.zeros(max_size, dtype=np.float32)
+
+        # Ring parameters
+        self.__position = 0
+        self.__size = 0
+
+        # Random generator for sampling
+        self.__rng = np.random.default_rng()
+
+        # Tracker of sampling phases (disabled by default)
+        self.__tracker = RunningTracker(enabled=False)
+
+    def set_tracker(self, tracker: RunningTracker) -> None:
+        """
+        Function to set tracker of sampling phases
+
+        :param tracker: tracker
+        :return: None
+        """
+
+        self.__tracker = tracker
 
-    def add(self, state: list or np.array, action: list or np.array, reward: float, next_state: list or np.array,
-            done: bool) -> None:
+    def add(self, state: list or np.array, action: int, reward: float, next_state: list or np.array,
+            done: bool) -> int:
         """
         Function to append new buffer element
 
@@ -28,24 +57,90 @@ class Buffer:
         :param reward: reward for action
         :param next_state: next state
         :param done: done or no
-        :return: None
+        :return: position of element in buffer
         """
 
-        self.__buffer.append((state, action, reward, next_state, done))
+        position = self.__position
 
-    def sample(self, batch_size: int) -> zip:
+        self.__states[self.__position] = state
+        self.__actions[self.__position] = action
+        self.__rewards[self.__position] = reward
+        self.__next_states[self.__position] = next_state
+        self.__dones[self.__position] = done
+
+        self.__position = (self.__position + 1) % self.__max_size
+        self.__size = min(self.__size + 1, self.__max_size)
+
+        return position
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                  dones: np.ndarray) -> np.ndarray:
+        """
+        Function to append many buffer elements at once
+
+        :param states: current states
+        :param actions: actions
+        :param rewards: rewards for actions
+        :param next_states: next states
+        :param dones: dones
+        :return: positions of elements in buffer
+        """
+
+        count = len(actions)
+
+        # Only last max_size elements can stay in buffer
+        if count >= self.__max_size:
+            positions = slice(0, self.__max_size)
+            rows = slice(count - self.__max_size, count)
+            self.__position = 0
+        else:
+            positions = (self.__position + np.arange(count)) % self.__max_size
+            rows = slice(0, count)
+            self.__position = (self.__position + count) % self.__max_size
+
+        self.__states[positions] = states[rows]
+        self.__actions[positions] = actions[rows]
+        self.__rewards[positions] = rewards[rows]
+        self.__next_states[positions] = next_states[rows]
+        self.__dones[positions] = dones[rows]
+
+        self.__size = min(self.__size + count, self.__max_size)
+
+        return np.arange(self.__max_size)[positions]
+
+    def sample(self, batch_size: int) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
         """
         Function to return samples of buffer by batch size
 
         :param batch_size: batch size
-        :return: samples
+        :return: tensors of states, actions, rewards, next states and dones (actions, rewards and dones as columns)
+        """
+
+        # If batch size bigger then buffer size
+        if self.__size < batch_size:
+            batch_size = self.__size
+
+        return self.gather(self.__rng.integers(0, self.__size, batch_size))
+
+    def gather(self, indices: np.ndarray) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor,
+                                                  torch.Tensor]:
         """
+        Function to return buffer elements by positions as batch tensors
+
+        :param indices: positions of elements
+        :return: tensors of states, actions, rewards, next states and dones (actions, rewards and dones as columns)
+        """
+
+        # Copy of rows by positions
+        with self.__tracker.track('sample'):
+            arrays = (self.__states[indices], self.__actions[indices], self.__rewards[indices],
+                      self.__next_states[indices], self.__dones[indices])
 
-        # If batch size bigger then maximum buffer size
-        if self.__max_size < batch_size:
-            batch_size = self.__max_size
+        # Zero-copy tensors over copied rows
+        with self.__tracker.track('tensorize'):
+            states, actions, rewards, next_states, dones = [torch.from_numpy(array) for array in arrays]
 
-        return zip(*random.sample(self.__buffer, batch_size))
+            return states, actions.unsqueeze(1), rewards.unsqueeze(1), next_states, dones.unsqueeze(1)
 
     def __len__(self) -> int:
         """
@@ -54,13 +149,59 @@ class Buffer:
         :return: length of buffer
         """
 
-        return len(self.__buffer)
+        return self.__size
+
+    def nbytes(self) -> int:
+        """
+        Function to return memory footprint of buffer storage
+
+        :return: size of buffer arrays in bytes
+        """
+
+        return (self.__states.nbytes + self.__actions.nbytes + self.__rewards.nbytes + self.__next_states.nbytes +
+                self.__dones.nbytes)
+
+    def return_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Function to return filled part of buffer arrays
+
+        :return: views of states, actions, rewards, next states and dones
+        """
+
+        return (self.__states[:self.__size], self.__actions[:self.__size], self.__rewards[:self.__size],
+                self.__next_states[:self.__size], self.__dones[:self.__size])
+
+    def return_state(self) -> dict:
+        """
+        Function to return copy of buffer contents for checkpoint
+
+        :return: dictionary of filled part of arrays with ring position
+        """
+
+        return {'states': self.__states[:self.__size].copy(),
+                'actions': self.__actions[:self.__size].copy(),
+                'rewards': self.__rewards[:self.__size].copy(),
+                'next_states': self.__next_states[:self.__size].copy(),
+                'dones': self.__dones[:self.__size].copy(),
+                'position': self.__position}
 
-    def return_deque(self) -> deque:
+    def load_state(self, state: dict) -> None:
         """
-        Function to return deque of buffer
+        Function to restore buffer contents returned by return_state
 
-        :return: deque of buffer
+        :param state: dictionary of filled part of arrays with ring position
+        :return: None
         """
 
-        return self.__buffer
+        size = len(state['actions'])
+        if size > self.__max_size:
+            raise ValueError(f'Buffer state has {size} elements, maximum size is {self.__max_size}')
+
+        self.__states[:size] = state['states']
+        self.__actions[:size] = state['actions']
+        self.__rewards[:size] = state['rewards']
+        self.__next_states[:size] = state['next_states']
+        self.__dones[:size] = state['dones']
+
+        self.__size = size
+        self.__position = int(state['position'])
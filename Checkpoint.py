@@ -0,0 +1,156 @@
+import os
+import pickle
+import queue
+import shutil
+import threading
+import time
+import warnings
+import zipfile
+
+import numpy as np
+import torch
+
+from Agent import Agent
+
+
+class Checkpointer:
+    """
+    Class of periodic training checkpoints written asynchronously by background thread
+    """
+
+    def __init__(self, directory: str or os.path, every_episodes: int = 100, every_seconds: float = None) -> None:
+        """
+        Function to init checkpointer
+
+        :param directory: checkpoints directory
+        :param every_episodes: episodes between checkpoints (None to disable)
+        :param every_seconds: seconds between checkpoints (None to disable)
+        """
+
+        self.__directory = directory
+        self.__every_episodes = every_episodes
+        self.__every_seconds = every_seconds
+        self.__last_time = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+
+        # One pending snapshot, newer snapshot replaces not written one
+        self.__pending = queue.Queue(maxsize=1)
+        self.__writer = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__writer.start()
+
+    def due(self, episode: int) -> bool:
+        """
+        Function to check that checkpoint must be made after episode
+
+        :param episode: count of finished episodes
+        :return: True if checkpoint is due
+        """
+
+        return (self.__every_episodes is not None and episode % self.__every_episodes == 0) or \
+               (self.__every_seconds is not None and time.monotonic() - self.__last_time >= self.__every_seconds)
+
+    def save(self, episode: int, epsilon: float, agent: Agent) -> None:
+        """
+        Function to snapshot agent training state and queue it for writing without waiting
+
+        :param episode: count of finished episodes
+        :param epsilon: current epsilon
+        :param agent: agent
+        :return: None
+        """
+
+        self.__last_time = time.monotonic()
+        snapshot = {'episode': episode, 'epsilon': epsilon, **agent.return_checkpoint()}
+
+        while True:
+            try:
+                self.__pending.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.__pending.get_nowait()
+                    self.__pending.task_done()
+                except queue.Empty:
+                    pass
+
+    def latest(self) -> dict or None:
+        """
+        Function to read latest written checkpoint
+
+        :return: dictionary of training state (None if there is no checkpoint or it is unreadable)
+        """
+
+        try:
+            with open(os.path.join(self.__directory, 'latest')) as file:
+                path = os.path.join(self.__directory, file.read().strip())
+
+            checkpoint = torch.load(os.path.join(path, 'state.pt'))
+            with np.load(os.path.join(path, 'buffer.npz')) as buffer:
+                checkpoint['buffer'] = dict(buffer)
+        except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError, RuntimeError, zipfile.BadZipFile):
+            return None
+
+        return checkpoint
+
+    def wait(self) -> None:
+        """
+        Function to wait until queued checkpoint is written
+
+        :return: None
+        """
+
+        self.__pending.join()
+
+    def clear(self) -> None:
+        """
+        Function to remove all checkpoints (after finished training)
+
+        :return: None
+        """
+
+        self.wait()
+        shutil.rmtree(self.__directory, ignore_errors=True)
+
+    def __write_loop(self) -> None:
+        """
+        Function of writing thread
+
+        :return: None
+        """
+
+        while True:
+            snapshot = self.__pending.get()
+
+            # Failed write skips one checkpoint, writing thread keeps running for next ones
+            try:
+                self.__write(snapshot)
+            except Exception as error:
+                warnings.warn(f'Checkpoint of episode {snapshot["episode"]} was not written: {error}')
+            finally:
+                self.__pending.task_done()
+
+    def __write(self, snapshot: dict) -> None:
+        """
+        Function to write snapshot: networks and optimizer by torch.save, buffer arrays by numpy .npz
+
+        :param snapshot: dictionary of training state
+        :return: None
+        """
+
+        name = f'checkpoint-{snapshot["episode"]}'
+        path = os.path.join(self.__directory, name)
+        os.makedirs(path, exist_ok=True)
+
+        buffer = snapshot.pop('buffer')
+        np.savez(os.path.join(path, 'buffer.npz'), **buffer)
+        torch.save(snapshot, os.path.join(path, 'state.pt'))
+
+        # Switch latest checkpoint atomically and remove older ones
+        with open(os.path.join(self.__directory, 'latest.tmp'), 'w') as file:
+            file.write(name)
+        os.replace(os.path.join(self.__directory, 'latest.tmp'), os.path.join(self.__directory, 'latest'))
+
+        for old in os.listdir(self.__directory):
+            if old.startswith('checkpoint-') and old != name:
+                shutil.rmtree(os.path.join(self.__directory, old), ignore_errors=True)
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class ConvergenceMonitor:
+    """
+    Class of training convergence monitor by moving average of TD losses (episode rewards of logged data do not
+    depend on agent actions, so they are not a convergence signal)
+    """
+
+    def __init__(self, window: int = 20, patience: int = 50, min_delta: float = 0.01) -> None:
+        """
+        Function to init monitor
+
+        :param window: count of last episodes for moving average
+        :param patience: count of episodes without improvement to stop
+        :param min_delta: minimal relative fall of moving average counted as improvement
+        """
+
+        self.__window = window
+        self.__patience = patience
+        self.__min_delta = min_delta
+
+        # History of episodes losses
+        self.__losses = []
+
+        # Best moving average and episodes without improvement
+        self.__best_loss = np.inf
+        self.__loss_wait = 0
+
+        self.__reason = None
+
+    def update(self, loss: float = None) -> bool:
+        """
+        Function to add episode TD loss and check convergence
+
+        :param loss: last training loss of episode (None if agent was not trained yet)
+        :return: True if training converged
+        """
+
+        if loss is None:
+            return False
+
+        self.__losses.append(loss)
+
+        if len(self.__losses) < self.__window:
+            return False
+
+        # Loss moving average must fall
+        loss_average = np.mean(self.__losses[-self.__window:])
+        if loss_average < self.__best_loss * (1 - self.__min_delta):
+            self.__best_loss = loss_average
+            self.__loss_wait = 0
+        else:
+            self.__loss_wait += 1
+
+        if self.__loss_wait >= self.__patience:
+            self.__reason = f'average TD loss did not fall by {self.__min_delta:.0%} for {self.__patience} episodes'
+            return True
+
+        return False
+
+    def return_reason(self) -> str:
+        """
+        Function to return reason of stop
+
+        :return: reason (None if training did not converge)
+        """
+
+        return self.__reason
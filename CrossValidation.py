@@ -0,0 +1,148 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import torch
+
+from Agent import Agent
+from Dataset import Dataset
+from DQN import dqn, CONFIG
+from Environment import Environment
+
+# Dataset of worker process (memory-mapped preprocessed cache, loaded once per worker)
+WORKER_DATASET = None
+
+
+def split_cases(cases_count: int, folds: int, seed: int = None) -> list[np.ndarray]:
+    """
+    Function to split cases numbers into shuffled folds
+
+    :param cases_count: count of cases
+    :param folds: count of folds
+    :param seed: random seed
+    :return: list of sorted cases numbers of every fold
+    """
+
+    permutation = np.random.default_rng(seed).permutation(cases_count)
+
+    return [np.sort(fold) for fold in np.array_split(permutation, folds)]
+
+
+def td_error(agent: Agent, dataset: Dataset, gamma: float = 0.99) -> float:
+    """
+    Function of mean squared TD (Bellman) error of agent Q network over all logged transitions of dataset
+
+    :param agent: trained agent
+    :param dataset: dataset (usually held-out)
+    :param gamma: gamma
+    :return: mean squared error
+    """
+
+    states, actions, rewards, next_states, dones = Environment(dataset).return_transitions()
+    q_network = agent.return_q_network()
+
+    q_values = q_network.q_values(states)[np.arange(len(actions)), actions]
+    target_q_values = rewards + gamma * q_network.q_values(next_states).max(axis=1) * (1 - dones)
+
+    return float(np.mean((q_values - target_q_values) ** 2))
+
+
+def evaluate(agent: Agent, dataset: Dataset, gamma: float = 0.99) -> dict:
+    """
+    Function of offline evaluation of agent on held-out dataset by one batched pass over all lines
+
+    :param agent: trained agent
+    :param dataset: held-out dataset
+    :param gamma: gamma of TD error
+    :return: dictionary of metrics
+    """
+
+    arrays = dataset.return_arrays()
+    predicted = agent.return_q_network().predict_batch(arrays['states'])[0]
+    agree = predicted == arrays['actions']
+
+    # Outcomes and rewards of logged treatments
+    good = dataset.return_dataset()['outcome_tar'].to_numpy() == 0
+    rewards = Environment(dataset).return_rewards()
+
+    return {'cases': dataset.episodes_count(),
+            'lines': dataset.size(),
+            'agreement': agree.mean(),
+            'agreement_good_outcome': agree[good].mean() if good.any() else np.nan,
+            'agreement_bad_outcome': agree[~good].mean() if (~good).any() else np.nan,
+            'reward_when_agree': rewards[agree].mean() if agree.any() else np.nan,
+            'reward_when_disagree': rewards[~agree].mean() if (~agree).any() else np.nan,
+            'td_error': td_error(agent, dataset, gamma)}
+
+
+def init_worker(file_path: str or os.path, threads: int) -> None:
+    """
+    Function to init fold worker process: limit torch threads and map preprocessed dataset once
+
+    :param file_path: path to dataset file
+    :param threads: count of torch threads of worker
+    :return: None
+    """
+
+    global WORKER_DATASET
+
+    torch.set_num_threads(threads)
+    WORKER_DATASET = Dataset(file_path)
+
+
+def run_fold(fold: int, test_cases: np.ndarray, config: dict) -> dict:
+    """
+    Function to train agent on all cases except fold and evaluate it on fold cases
+
+    :param fold: number of fold
+    :param test_cases: cases numbers of fold
+    :param config: training parameters
+    :return: dictionary of fold metrics
+    """
+
+    train_cases = np.setdiff1d(np.arange(WORKER_DATASET.episodes_count()), test_cases)
+
+    gen = dqn(WORKER_DATASET.subset(train_cases), config)
+    while True:
+        try:
+            next(gen)
+        except StopIteration as e:
+            agent = e.value
+            break
+
+    return {'fold': fold, **evaluate(agent, WORKER_DATASET.subset(test_cases), config['gamma'])}
+
+
+def cross_validation(file_path: str or os.path, folds: int = 5, config: dict = None, workers: int = None,
+                     threads: int = 1, seed: int = None) -> pd.DataFrame:
+    """
+    Function of K-fold cross-validation by cases with folds trained in parallel processes
+
+    :param file_path: path to dataset file
+    :param folds: count of folds
+    :param config: training parameters (missing ones are taken from CONFIG)
+    :param workers: count of worker processes (count of cores divided by threads if None)
+    :param threads: count of torch threads of every worker
+    :param seed: random seed of split
+    :return: report with metrics of every fold and their mean
+    """
+
+    config = {**CONFIG, **(config or {})}
+
+    # Preprocess dataset once, workers memory-map its cache
+    cases = split_cases(Dataset(file_path).episodes_count(), folds, seed)
+
+    if workers is None:
+        workers = max(1, min(folds, (os.cpu_count() or 1) // threads))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(file_path, threads)) as executor:
+        report = pd.DataFrame(executor.map(run_fold, range(folds), cases, itertools.repeat(config)))
+
+    report = report.set_index('fold')
+    report.loc['mean'] = report.mean()
+
+    return report
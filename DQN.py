@@ -1,41 +1,159 @@
-import matplotlib.pyplot as plt
+import time
 import numpy as np
+import torch
 
 from Environment import Environment
 from Agent import Agent
 from Dataset import Dataset
+from ConvergenceMonitor import ConvergenceMonitor
+from VectorEnvironment import VectorEnvironment
+from Checkpoint import Checkpointer
+from RunningTracker import RunningTracker
 
+# Default training parameters
+CONFIG = {
+    'start_epsilon': 1.0,
+    'end_epsilon': 0.01,
+    'epsilon_decay': 0.99,
+    'batch_size': 64,
+    'buffer_size': None,
+    'gamma': 0.99,
+    'lr': 0.0001,
+    'target_update': 100,
+    'tau': None,
+    'train_every': 1,
+    'gradient_steps': 1,
+    'prioritized': False,
+    'alpha': 0.6,
+    'beta': 0.4,
+    'double': True
+}
 
-def dqn(dataset: Dataset) -> Agent:
+# Training parameters passed to Agent
+AGENT_PARAMETERS = ('batch_size', 'gamma', 'lr', 'target_update', 'tau', 'train_every', 'gradient_steps',
+                    'prioritized', 'alpha', 'beta', 'double')
+
+
+def create_agent(dataset: Dataset, config: dict = None, buffer_size: int = None,
+                 tracker: RunningTracker = None) -> Agent:
+    """
+    Function to create agent for dataset by training parameters
+
+    :param dataset: input dataset
+    :param config: training parameters (missing ones are taken from CONFIG)
+    :param buffer_size: agent buffer size (buffer_size of config if None, dataset size if both are None)
+    :param tracker: tracker of training phases (None to disable)
+    :return: agent
+    """
+
+    config = {**CONFIG, **(config or {})}
+
+    if buffer_size is None:
+        buffer_size = dataset.size() if config['buffer_size'] is None else int(config['buffer_size'])
+
+    return Agent(Environment(dataset), buffer_size=buffer_size,
+                 tracker=tracker, **{parameter: config[parameter] for parameter in AGENT_PARAMETERS})
+
+
+def plot_rewards(rewards: list) -> None:
+    """
+    Function to plot average rewards per episode (matplotlib is imported only here)
+
+    :param rewards: average rewards per episode
+    :return: None
+    """
+
+    import matplotlib.pyplot as plt
+
+    plt.plot(rewards)
+    plt.xlabel("Episode")
+    plt.ylabel("Reward")
+    plt.title("Reward per episode")
+    plt.show()
+
+
+def episode_metrics(agent: Agent, episode: int, episodes: int, rows: int, total_rows: int, start_row: int,
+                    start_time: float, epsilon: float, reward: float, optimizer_steps: int,
+                    tracker: RunningTracker = None) -> dict:
+    """
+    Function to return metrics of finished episode, the same for all training generators
+
+    :param agent: agent
+    :param episode: count of finished episodes
+    :param episodes: count of all episodes
+    :param rows: count of finished rows
+    :param total_rows: count of all rows
+    :param start_row: count of rows finished before this run (resumed training)
+    :param start_time: perf_counter time of start of this run
+    :param epsilon: current epsilon
+    :param reward: average reward of episode
+    :param optimizer_steps: optimizer steps made for episode
+    :param tracker: tracker of training phases (None if disabled)
+    :return: dictionary of episode, episodes, rows, rows_per_second, eta, elapsed, epsilon, reward, loss,
+             optimizer_steps and phases
+    """
+
+    # Throughput and estimated remaining time by rows
+    elapsed = time.perf_counter() - start_time
+    rows_per_second = float(rows - start_row) / elapsed if elapsed > 0 else 0.0
+    eta = float(total_rows - rows) / rows_per_second if rows_per_second > 0 else None
+
+    return {'episode': episode, 'episodes': episodes, 'rows': int(rows), 'rows_per_second': rows_per_second,
+            'eta': eta, 'elapsed': elapsed, 'epsilon': epsilon, 'optimizer_steps': optimizer_steps,
+            'reward': float(reward), 'loss': agent.return_last_loss(),
+            'phases': tracker.snapshot() if tracker is not None and tracker.enabled else {}}
+
+
+def dqn(dataset: Dataset, config: dict = None, monitor: ConvergenceMonitor = None,
+        checkpointer: Checkpointer = None, resume: bool = False, tracker: RunningTracker = None,
+        plot: bool = False) -> Agent:
     """
     Function of dqn learning by input dataset
 
+    Every episode yields metrics: episode, episodes, rows, rows_per_second, eta, elapsed, epsilon, reward, loss,
+    optimizer_steps and phases (running times of training phases if tracker is enabled)
+
     :param dataset: input dataset
+    :param config: training parameters (missing ones are taken from CONFIG)
+    :param monitor: convergence monitor for early stopping by TD loss (None to run all episodes)
+    :param checkpointer: checkpointer for periodic checkpoints (None to disable)
+    :param resume: continue from latest checkpoint of checkpointer
+    :param tracker: tracker of training phases and events stream (None to disable)
+    :param plot: plot average rewards per episode after training
     :return: trained agent
     """
 
     # Model parameters
-    BUFFER_SIZE = dataset.size()
-    START_EPSILON = 1.0
-    END_EPSILON = 0.01
-    EPSILON_DECAY = 0.99
+    config = {**CONFIG, **(config or {})}
     rewards_list = []
     average_episode_rewards_list = []
 
-    # Environment object
-    env = Environment(dataset)
-
     # Agent object
-    agent = Agent(env, buffer_size=BUFFER_SIZE)
+    tracker = RunningTracker(enabled=False) if tracker is None else tracker
+    agent = create_agent(dataset, config, tracker=tracker)
 
     # Loop parameters
     num_episodes = dataset.episodes_count()
-    epsilon = START_EPSILON
+    offsets = dataset.return_arrays()['offsets']
+    epsilon = config['start_epsilon']
+    start_episode = 0
+
+    # Continue from latest checkpoint
+    checkpoint = checkpointer.latest() if checkpointer is not None and resume else None
+    if checkpoint is not None:
+        agent.load_checkpoint(checkpoint)
+        epsilon = checkpoint['epsilon']
+        start_episode = checkpoint['episode']
+
+    # Throughput parameters
+    start_time = time.perf_counter()
+    start_row = offsets[start_episode]
 
     # Loop for every episode
-    for episode in range(num_episodes):
+    for episode in range(start_episode, num_episodes):
 
         # Rewards for batch
+        optimizer_steps = agent.return_optimizer_steps()
         rewards = agent.run_episode(epsilon)
         rewards_list.append(rewards)
 
@@ -43,9 +161,25 @@ def dqn(dataset: Dataset) -> Agent:
         average_episode_rewards_list.append(np.mean(rewards_list[-1]))
 
         # Epsilon update
-        epsilon = max(END_EPSILON, epsilon * EPSILON_DECAY)
+        epsilon = max(config['end_epsilon'], epsilon * config['epsilon_decay'])
 
-        yield episode + 1
+        # Checkpoint is written by background thread
+        if checkpointer is not None and checkpointer.due(episode + 1):
+            checkpointer.save(episode + 1, epsilon, agent)
+
+        metrics = episode_metrics(agent, episode + 1, num_episodes, offsets[episode + 1], offsets[-1], start_row,
+                                  start_time, epsilon, average_episode_rewards_list[-1],
+                                  agent.return_optimizer_steps() - optimizer_steps, tracker)
+
+        tracker.emit(metrics)
+        yield metrics
+
+        # Early stopping
+        if monitor is not None and monitor.update(agent.return_last_loss()):
+            event = {'episode': episode + 1, 'stopped': True, 'reason': monitor.return_reason()}
+            tracker.emit(event)
+            yield event
+            break
 
         '''
         # Printing average reward for last iteration for every 10 (deleted for application)
@@ -53,13 +187,135 @@ def dqn(dataset: Dataset) -> Agent:
             print(f"Episode {episode + 1}: Average Rewards = {average_episode_rewards_list[-1]}")
         '''
 
-    '''
-    # Plotting results (deleted for application)
-    plt.plot(average_episode_rewards_list)
-    plt.xlabel("Episode")
-    plt.ylabel("Reward")
-    plt.title("Reward per episode")
-    plt.show()
-    '''
+    # Plotting results
+    if plot:
+        plot_rewards(average_episode_rewards_list)
+
+    if checkpointer is not None:
+        checkpointer.wait()
+
+    return agent
+
+
+def vector_dqn(dataset: Dataset, num_envs: int = 16, config: dict = None, monitor: ConvergenceMonitor = None) -> Agent:
+    """
+    Function of dqn learning with several cases advanced in lockstep and actions chosen by one forward pass
+
+    Every finished episode yields the same metrics as dqn
+
+    :param dataset: input dataset
+    :param num_envs: count of cases advanced at once
+    :param config: training parameters (missing ones are taken from CONFIG)
+    :param monitor: convergence monitor for early stopping (None to run all episodes)
+    :return: trained agent
+    """
+
+    # Model parameters
+    config = {**CONFIG, **(config or {})}
+    epsilon = config['start_epsilon']
+
+    # Vector environment and agent objects
+    vector_env = VectorEnvironment(dataset, num_envs)
+    agent = create_agent(dataset, config)
+
+    states = vector_env.reset()
+    slots_rewards = [[] for _ in range(num_envs)]
+    optimizer_steps = agent.return_optimizer_steps()
+    episode = 0
+
+    # Throughput parameters (episodes finish out of order, so rows are counted by finished episodes)
+    start_time = time.perf_counter()
+    rows = 0
+
+    while not vector_env.finished():
+        actions = agent.act_batch(states, epsilon)
+        next_states, rewards, dones, info = vector_env.step(actions)
+
+        active = info['active']
+        agent.learn(states[active], actions[active], rewards[active], info['final_states'][active], dones[active])
+
+        # Episodes finished on this step
+        for slot in np.flatnonzero(active):
+            slots_rewards[slot].append(rewards[slot])
+            if not dones[slot]:
+                continue
+
+            episode += 1
+            rows += len(slots_rewards[slot])
+            reward = np.mean(slots_rewards[slot])
+            slots_rewards[slot] = []
+
+            # Epsilon update
+            epsilon = max(config['end_epsilon'], epsilon * config['epsilon_decay'])
+
+            yield episode_metrics(agent, episode, dataset.episodes_count(), rows, dataset.size(), 0, start_time,
+                                  epsilon, reward, agent.return_optimizer_steps() - optimizer_steps)
+            optimizer_steps = agent.return_optimizer_steps()
+
+            # Early stopping
+            if monitor is not None and monitor.update(agent.return_last_loss()):
+                yield {'episode': episode, 'stopped': True, 'reason': monitor.return_reason()}
+                return agent
+
+        states = next_states
+
+    return agent
+
+
+def offline_dqn(dataset: Dataset, batch_size: int = 256, epochs: int = 10, updates_per_step: int = 1,
+                gamma: float = 0.99, lr: float = 0.001) -> Agent:
+    """
+    Function of offline (fitted Q) learning by shuffled minibatch epochs over all logged transitions
+
+    :param dataset: input dataset
+    :param batch_size: minibatch size
+    :param epochs: count of passes over dataset
+    :param updates_per_step: optimizer steps for every minibatch
+    :param gamma: gamma
+    :param lr: learning rate
+    :return: trained agent
+    """
+
+    # Environment and agent objects
+    env = Environment(dataset)
+    agent = Agent(env, buffer_size=dataset.size(), batch_size=batch_size, gamma=gamma, lr=lr)
+
+    agent.prefill_from_dataset()
+
+    return (yield from fit_buffer(agent, batch_size, epochs, updates_per_step))
+
+
+def fit_buffer(agent: Agent, batch_size: int = 256, epochs: int = 10, updates_per_step: int = 1) -> Agent:
+    """
+    Function of shuffled minibatch epochs over all transitions of agent buffer
+
+    :param agent: agent with filled buffer
+    :param batch_size: minibatch size
+    :param epochs: count of passes over buffer
+    :param updates_per_step: optimizer steps for every minibatch
+    :return: trained agent
+    """
+
+    # All transitions as tensors (zero-copy over buffer arrays)
+    states, actions, rewards, next_states, dones = [torch.from_numpy(array) for array in
+                                                    agent.return_buffer().return_arrays()]
+    actions, rewards, dones = actions.unsqueeze(1), rewards.unsqueeze(1), dones.unsqueeze(1)
+    count = len(actions)
+
+    # Loop for every epoch
+    for epoch in range(epochs):
+        permutation = torch.randperm(count)
+
+        optimizer_steps = agent.return_optimizer_steps()
+
+        for start in range(0, count, batch_size):
+            indices = permutation[start:start + batch_size]
+            batch = (states[indices], actions[indices], rewards[indices], next_states[indices], dones[indices])
+
+            for _ in range(updates_per_step):
+                agent.train_batch(*batch)
+
+        yield {'epoch': epoch + 1, 'optimizer_steps': agent.return_optimizer_steps() - optimizer_steps,
+               'loss': agent.return_last_loss()}
 
     return agent
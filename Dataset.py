@@ -1,5 +1,20 @@
-import pandas as pd
+import json
 import os
+import shutil
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from DatasetSchema import DatasetSchema
+
+# Version of preprocessed dataset cache format
+CACHE_FORMAT = 1
+
+# Locks of cache building by cache path, so threads of one process (scheduler jobs, UI) build every cache once
+CACHE_LOCKS = {}
+CACHE_LOCKS_LOCK = threading.Lock()
 
 
 class Dataset:
@@ -7,15 +22,48 @@ class Dataset:
     Class of methods for input dataset
     """
 
-    def __init__(self, file_path: str or os.path) -> None:
+    def __init__(self, file_path: str or os.path, cache: bool = True) -> None:
         """
         Function to init object of class
 
         :param file_path: path to file with data
+        :param cache: use (and write) preprocessed cache next to file
+        """
+
+        cache_path = f'{file_path}.cache'
+
+        if not cache:
+            self.__set_dataset(self.preprocess(pd.read_pickle(file_path)))
+            return
+
+        with CACHE_LOCKS_LOCK:
+            cache_lock = CACHE_LOCKS.setdefault(os.path.abspath(cache_path), threading.Lock())
+
+        # Thread waiting for cache built by other thread reads it instead of building again
+        with cache_lock:
+            # Memory-map preprocessed arrays if cache is actual
+            if self.__read_cache(cache_path, file_path):
+                return
+
+            # Read and preprocess file
+            self.__set_dataset(self.preprocess(pd.read_pickle(file_path)))
+
+            # Cache is optional, unwritable directory only costs preprocessing next time
+            try:
+                self.__write_cache(cache_path, file_path)
+            except OSError as error:
+                warnings.warn(f'Dataset cache was not written: {error}')
+
+    @staticmethod
+    def preprocess(dataset: pd.DataFrame, column_means: pd.Series = None) -> pd.DataFrame:
         """
+        Function of preprocessing of raw dataframe
 
-        # Read file
-        dataset = pd.read_pickle(file_path)
+        :param dataset: raw dataframe indexed by case
+        :param column_means: means of columns to replace na left after replacing by means of cases (None to drop
+                             such lines)
+        :return: preprocessed dataframe
+        """
 
         # Means of columns by cases
         grouped_means = dataset.groupby(dataset.index).mean(numeric_only=True).round(2)
@@ -23,6 +71,10 @@ class Dataset:
         # Replace na by mean by group
         dataset = dataset.combine_first(grouped_means)
 
+        # Replace na of columns missing in whole case by stored means
+        if column_means is not None:
+            dataset = dataset.fillna(column_means)
+
         # Drop na's from dataset
         dataset.dropna(how='any', inplace=True)
 
@@ -37,7 +89,132 @@ class Dataset:
                           [column for column in dataset.columns if column.endswith('_dinam_control')] +
                           ['end_epizode', 'outcome_tar']]
 
+        return dataset
+
+    @staticmethod
+    def from_frame(dataset: pd.DataFrame, column_means: pd.Series = None) -> 'Dataset':
+        """
+        Function of creating dataset by raw dataframe (without file and cache)
+
+        :param dataset: raw dataframe indexed by case
+        :param column_means: means of columns to replace na left after replacing by means of cases
+        :return: dataset object
+        """
+
+        result = Dataset.__new__(Dataset)
+        result.__set_dataset(Dataset.preprocess(dataset, column_means))
+
+        return result
+
+    def __set_dataset(self, dataset: pd.DataFrame, arrays: dict = None) -> None:
+        """
+        Function to set preprocessed dataframe with its schema, arrays and cached states and actions views
+
+        :param dataset: preprocessed dataframe
+        :param arrays: precomputed arrays (built by dataframe if None)
+        :return: None
+        """
+
         self.__dataset = dataset
+        self.__schema = DatasetSchema(dataset.columns)
+        self.__arrays = self.__build_arrays(dataset, self.__schema) if arrays is None else arrays
+        self.__states_and_actions = (dataset[list(self.__schema.return_state_columns())],
+                                     dataset[list(self.__schema.return_action_columns())])
+
+    @staticmethod
+    def __build_arrays(dataset: pd.DataFrame, schema: DatasetSchema) -> dict:
+        """
+        Function to build arrays of dataset for environment and buffer
+
+        :param dataset: preprocessed dataframe
+        :param schema: schema of dataframe
+        :return: dictionary of arrays (states, actions, dones, offsets)
+        """
+
+        values = dataset.to_numpy()
+
+        # Rows range of every case (dataset is sorted by case, so cases are contiguous)
+        index = dataset.index.to_numpy()
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]]) if len(index) else np.array([], dtype=np.int64)
+
+        arrays = {'states': np.ascontiguousarray(values[:, list(schema.return_state_positions())], dtype=np.float32),
+                  'actions': values[:, list(schema.return_action_positions())].argmax(axis=1).astype(np.int64),
+                  'dones': dataset['end_epizode'].to_numpy(dtype=np.float32),
+                  'offsets': np.append(starts, len(index)).astype(np.int64)}
+
+        return arrays
+
+    def __write_cache(self, cache_path: str, file_path: str or os.path) -> None:
+        """
+        Function to write preprocessed dataset as .npy arrays with json schema
+
+        :param cache_path: cache directory
+        :param file_path: path to source file
+        :return: None
+        """
+
+        source = os.stat(file_path)
+        index = self.__dataset.index.to_numpy()
+
+        schema = {'format': CACHE_FORMAT,
+                  'source_size': source.st_size,
+                  'source_mtime': source.st_mtime_ns,
+                  'index_name': self.__dataset.index.name,
+                  **self.__schema.to_dict()}
+
+        arrays = {**self.__arrays,
+                  'index': index.astype(str) if index.dtype == object else index,
+                  'values': self.__dataset.to_numpy(dtype=np.float64)}
+
+        # Write to temporary directory of this process and thread (other processes may build same cache) and replace
+        # old cache
+        temp_path = f'{cache_path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+        try:
+            os.makedirs(temp_path)
+
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_path, f'{name}.npy'), array, allow_pickle=False)
+            with open(os.path.join(temp_path, 'schema.json'), 'w') as file:
+                json.dump(schema, file)
+
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.replace(temp_path, cache_path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def __read_cache(self, cache_path: str, file_path: str or os.path) -> bool:
+        """
+        Function to memory-map preprocessed dataset written by __write_cache
+
+        :param cache_path: cache directory
+        :param file_path: path to source file
+        :return: True if cache is actual and was read
+        """
+
+        # Any broken, partial or unreadable cache is a cache miss
+        try:
+            with open(os.path.join(cache_path, 'schema.json')) as file:
+                schema = json.load(file)
+
+            source = os.stat(file_path)
+            if schema.get('format') != CACHE_FORMAT or schema['source_size'] != source.st_size or \
+                    schema['source_mtime'] != source.st_mtime_ns:
+                return False
+
+            # Copy-on-write mapping: arrays are writable for torch.from_numpy, the file is never changed
+            arrays = {name: np.load(os.path.join(cache_path, f'{name}.npy'), mmap_mode='c')
+                      for name in ('states', 'actions', 'dones', 'offsets', 'index', 'values')}
+
+            dataset = pd.DataFrame(arrays.pop('values'), columns=DatasetSchema.from_dict(schema).return_columns(),
+                                   index=pd.Index(arrays.pop('index'), name=schema['index_name']), copy=False)
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        self.__set_dataset(dataset, arrays)
+
+        return True
 
     def return_dataset(self) -> pd.DataFrame:
         """
@@ -48,6 +225,15 @@ class Dataset:
 
         return self.__dataset
 
+    def return_arrays(self) -> dict:
+        """
+        Function of returning arrays of dataset (memory-mapped if dataset was read from cache)
+
+        :return: dictionary of states (float32), logged actions, dones (float32) and cases offsets arrays
+        """
+
+        return self.__arrays
+
     def return_states_and_actions(self) -> tuple[pd.DataFrame, pd.DataFrame]:
         """
         Function of returning states and actions of dataset
@@ -55,10 +241,43 @@ class Dataset:
         :return: tuple of states and actions dataset
         """
 
-        return (self.__dataset[[column for column in self.__dataset.columns if column.endswith('_stat_control')] +
-                               [column for column in self.__dataset.columns if column.endswith('_stat_fact')] +
-                               [column for column in self.__dataset.columns if column.endswith('_dinam_fact')]],
-                self.__dataset[[column for column in self.__dataset.columns if column.endswith('_dinam_control')]])
+        return self.__states_and_actions
+
+    def subset(self, case_nums: list or np.array) -> 'Dataset':
+        """
+        Function of returning dataset of given cases without reading and preprocessing file again
+
+        :param case_nums: numbers of cases (positions in unique cases order)
+        :return: dataset object of cases
+        """
+
+        offsets = self.__arrays['offsets']
+        rows = np.concatenate([np.arange(offsets[case_num], offsets[case_num + 1])
+                               for case_num in np.sort(case_nums)] or [np.array([], dtype=np.int64)])
+
+        dataset = Dataset.__new__(Dataset)
+        dataset.__set_dataset(self.__dataset.iloc[rows])
+
+        return dataset
+
+    def fingerprint(self) -> dict:
+        """
+        Function of returning fingerprint of dataset for incremental training
+
+        :return: dictionary of cases identifiers and means of columns
+        """
+
+        return {'cases': self.__dataset.index.unique().tolist(),
+                'column_means': {column: float(mean) for column, mean in self.__dataset.mean().items()}}
+
+    def return_schema(self) -> DatasetSchema:
+        """
+        Function of returning columns layout of dataset
+
+        :return: dataset schema
+        """
+
+        return self.__schema
 
     def size(self) -> int:
         """
@@ -76,9 +295,7 @@ class Dataset:
         :return: dataset state dimensional
         """
 
-        return len([column for column in self.__dataset.columns if column.endswith('_stat_control')] +
-                   [column for column in self.__dataset.columns if column.endswith('_stat_fact')] +
-                   [column for column in self.__dataset.columns if column.endswith('_dinam_fact')])
+        return self.__schema.state_dim()
 
     def action_dim(self) -> int:
         """
@@ -87,7 +304,7 @@ class Dataset:
         :return: dataset action dimensional
         """
 
-        return len([column for column in self.__dataset.columns if column.endswith('_dinam_control')])
+        return self.__schema.action_dim()
 
     def episodes_count(self) -> int:
         """
@@ -96,5 +313,5 @@ class Dataset:
         :return: count of episodes
         """
 
-        return len(self.__dataset.index.unique())
+        return len(self.__arrays['offsets']) - 1
 
@@ -0,0 +1,157 @@
+# Suffixes of column groups in columns order
+COLUMN_GROUPS = ('stat_control', 'stat_fact', 'dinam_fact', 'dinam_control')
+
+# Groups of columns making the state
+STATE_GROUPS = ('stat_control', 'stat_fact', 'dinam_fact')
+
+
+class DatasetSchema:
+    """
+    Class of precomputed columns layout of dataset (column groups, positions, action names and dimensionals)
+    """
+
+    def __init__(self, columns: list or tuple) -> None:
+        """
+        Function to init schema by dataset columns
+
+        :param columns: columns of preprocessed dataset
+        """
+
+        self.__columns = tuple(columns)
+
+        # Column groups
+        self.__groups = {group: tuple(column for column in self.__columns if column.endswith(f'_{group}'))
+                         for group in COLUMN_GROUPS}
+        self.__names = {group: tuple(column[:-len(f'_{group}')] for column in self.__groups[group])
+                        for group in COLUMN_GROUPS}
+
+        # States and actions columns
+        self.__state_columns = sum((self.__groups[group] for group in STATE_GROUPS), ())
+        self.__action_columns = self.__groups['dinam_control']
+
+        # Positions of states and actions columns
+        self.__state_positions = tuple(self.__columns.index(column) for column in self.__state_columns)
+        self.__action_positions = tuple(self.__columns.index(column) for column in self.__action_columns)
+
+    def return_columns(self) -> tuple:
+        """
+        Function to return all columns
+
+        :return: columns
+        """
+
+        return self.__columns
+
+    def return_group(self, group: str, names: bool = False) -> tuple:
+        """
+        Function to return columns of group
+
+        :param group: group (one of COLUMN_GROUPS)
+        :param names: return names without group suffix
+        :return: columns of group
+        """
+
+        return self.__names[group] if names else self.__groups[group]
+
+    def return_state_columns(self) -> tuple:
+        """
+        Function to return state columns
+
+        :return: state columns
+        """
+
+        return self.__state_columns
+
+    def return_action_columns(self) -> tuple:
+        """
+        Function to return action columns
+
+        :return: action columns
+        """
+
+        return self.__action_columns
+
+    def return_action_names(self) -> tuple:
+        """
+        Function to return names of actions (treatments)
+
+        :return: action names
+        """
+
+        return self.__names['dinam_control']
+
+    def return_state_positions(self) -> tuple:
+        """
+        Function to return positions of state columns
+
+        :return: positions of state columns
+        """
+
+        return self.__state_positions
+
+    def return_action_positions(self) -> tuple:
+        """
+        Function to return positions of action columns
+
+        :return: positions of action columns
+        """
+
+        return self.__action_positions
+
+    def state_dim(self) -> int:
+        """
+        Function to return state dimensional
+
+        :return: state dimensional
+        """
+
+        return len(self.__state_columns)
+
+    def action_dim(self) -> int:
+        """
+        Function to return action dimensional
+
+        :return: action dimensional
+        """
+
+        return len(self.__action_columns)
+
+    def to_dict(self) -> dict:
+        """
+        Function to return schema as json serializable dictionary
+
+        :return: dictionary of columns and column groups
+        """
+
+        return {'columns': list(self.__columns),
+                'groups': {group: list(columns) for group, columns in self.__groups.items()}}
+
+    @staticmethod
+    def from_dict(schema: dict) -> 'DatasetSchema':
+        """
+        Function to create schema by dictionary of to_dict
+
+        :param schema: dictionary of schema
+        :return: schema
+        """
+
+        return DatasetSchema(schema['columns'])
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Function to compare schemas
+
+        :param other: other schema
+        :return: True if columns layouts are equal
+        """
+
+        return isinstance(other, DatasetSchema) and self.__columns == other.return_columns()
+
+    def __hash__(self) -> int:
+        """
+        Function to return hash of schema consistent with __eq__
+
+        :return: hash of columns layout
+        """
+
+        return hash(self.__columns)
@@ -2,7 +2,6 @@ from abc import ABC
 
 import gym
 import numpy as np
-import pandas as pd
 
 from Dataset import Dataset
 
@@ -23,33 +22,44 @@ class Environment(gym.Env, ABC):
         self.__dataset = dataset
 
         # Dataset like DataFrame
-        self.__dataset_lines = dataset.return_dataset()
+        dataset_lines = dataset.return_dataset()
 
-        # Dataset states
-        self.__states = dataset.return_states_and_actions()[0]
+        # Precomputed arrays of dataset (states table, logged actions, ends of episodes and cases offsets)
+        arrays = dataset.return_arrays()
+        self.__states = arrays['states']
+        self.__actions = arrays['actions']
+        self.__dones = arrays['dones']
+        self.__offsets = arrays['offsets']
+
+        # Rewards of every line (float64 to keep parity with pandas reward formula)
+        self.__rewards = (-100 * dataset_lines['outcome_tar'] - dataset_lines['current_process_duration'] +
+                          100).to_numpy(dtype=np.float64)
 
         # Dataset unique cases list
-        self.__cases = dataset.return_dataset().index.unique()
+        self.__cases = dataset_lines.index[self.__offsets[:-1]]
 
         # Environment parameters
         self.__current_case = None
         self.__current_case_num = -1
         self.__current_step = 0
+        self.__current_row = 0
 
-    def reset(self, **kwargs) -> pd.DataFrame:
+    def reset(self, **kwargs) -> np.ndarray:
         """
         Function of reset of environment
 
-        :return:
+        :param kwargs: case_num to start given case instead of next one
+        :return: first state of case
         """
 
-        self.__current_case_num += 1
+        self.__current_case_num = kwargs.get('case_num', self.__current_case_num + 1)
         self.__current_step = 0
         self.__current_case = self.__cases[self.__current_case_num]
+        self.__current_row = self.__offsets[self.__current_case_num]
 
-        return self.__states.loc[[self.__current_case]].iloc[0]
+        return self.__states[self.__current_row]
 
-    def step(self, action: list or np.array) -> tuple[list or np.array, float, bool]:
+    def step(self, action: list or np.array) -> tuple[np.ndarray, float, bool]:
         """
         Function of environment step by action
 
@@ -57,19 +67,39 @@ class Environment(gym.Env, ABC):
         :return: tuple of (next_action, reward, done)
         """
 
-        done = self.__dataset_lines.loc[[self.__current_case]].iloc[self.__current_step].end_epizode
-        reward = -100 * self.__dataset_lines.loc[[self.__current_case]].iloc[self.__current_step].outcome_tar - \
-                 self.__dataset_lines.loc[[self.__current_case]].iloc[self.__current_step].current_process_duration + 100
+        done = self.__dones[self.__current_row]
+        reward = self.__rewards[self.__current_row]
+
+        if not done:
+            if self.__current_row + 1 >= self.__offsets[self.__current_case_num + 1]:
+                raise IndexError(f'Case {self.__current_case} has no line with end of episode')
 
-        if done:
-            next_state = self.__states.loc[[self.__current_case]].iloc[self.__current_step]
-        else:
             self.__current_step += 1
-            self.__current_case = self.__cases[self.__current_case_num]
-            next_state = self.__states.loc[[self.__current_case]].iloc[self.__current_step]
+            self.__current_row += 1
+
+        next_state = self.__states[self.__current_row]
 
         return next_state, reward, done
 
+    def return_cursor(self) -> int:
+        """
+        Function to return number of current case
+
+        :return: number of current case (-1 before first reset)
+        """
+
+        return self.__current_case_num
+
+    def set_cursor(self, case_num: int) -> None:
+        """
+        Function to set number of current case, next reset starts the case after it
+
+        :param case_num: number of case
+        :return: None
+        """
+
+        self.__current_case_num = case_num
+
     def return_dataset(self) -> Dataset:
         """
         Function to return environment input dataset
@@ -78,3 +108,62 @@ class Environment(gym.Env, ABC):
         """
 
         return self.__dataset
+
+    def return_states(self) -> np.ndarray:
+        """
+        Function to return states table of environment
+
+        :return: float32 array of states (rows x state dimensional)
+        """
+
+        return self.__states
+
+    def return_rewards(self) -> np.ndarray:
+        """
+        Function to return rewards of every dataset line
+
+        :return: array of rewards
+        """
+
+        return self.__rewards
+
+    def return_dones(self) -> np.ndarray:
+        """
+        Function to return ends of episodes of every dataset line
+
+        :return: float32 array of end_epizode values
+        """
+
+        return self.__dones
+
+    def return_actions(self) -> np.ndarray:
+        """
+        Function to return logged actions of every dataset line
+
+        :return: array of action indices
+        """
+
+        return self.__actions
+
+    def return_transitions(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Function to return all logged transitions of dataset in one pass (same rules as step)
+
+        :return: tuple of (states, actions, rewards, next_states, dones)
+        """
+
+        # Next line of case, or the same line if episode is done or case is over
+        next_rows = np.arange(1, len(self.__states) + 1)
+        next_rows[self.__dones.astype(bool)] -= 1
+        next_rows[self.__offsets[1:] - 1] = self.__offsets[1:] - 1
+
+        return self.__states, self.__actions, self.__rewards, self.__states[next_rows], self.__dones
+
+    def return_offsets(self) -> np.ndarray:
+        """
+        Function to return rows ranges of cases
+
+        :return: array of offsets, case i takes rows offsets[i]:offsets[i + 1]
+        """
+
+        return self.__offsets
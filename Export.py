@@ -0,0 +1,73 @@
+import importlib.util
+import json
+import os
+
+import numpy as np
+import torch
+
+from Predictor import Predictor
+
+# Layers of QNetwork in order of forward pass
+LAYERS = ('layer_1', 'layer_2', 'layer_3')
+
+
+def export_torchscript(predictor: Predictor, file_path: str or os.path) -> None:
+    """
+    Function to export Q network of saved agent to TorchScript (traced, with schema as extra file)
+
+    :param predictor: predictor of saved agent
+    :param file_path: path to .pt file
+    :return: None
+    """
+
+    q_network = predictor.return_q_network()
+    example = torch.zeros(1, predictor.return_schema().state_dim())
+
+    with torch.no_grad():
+        traced = torch.jit.trace(q_network, example)
+
+    torch.jit.save(traced, file_path,
+                   _extra_files={'schema.json': json.dumps(predictor.return_schema().to_dict())})
+
+
+def export_onnx(predictor: Predictor, file_path: str or os.path) -> None:
+    """
+    Function to export Q network of saved agent to ONNX (input "states" and output "q_values" with dynamic batch)
+
+    :param predictor: predictor of saved agent
+    :param file_path: path to .onnx file
+    :return: None
+    """
+
+    # Optional dependency of torch.onnx
+    if importlib.util.find_spec('onnx') is None:
+        raise ImportError('ONNX export requires onnx package (pip install onnx)')
+
+    example = torch.zeros(1, predictor.return_schema().state_dim())
+
+    torch.onnx.export(predictor.return_q_network(), example, file_path, input_names=['states'],
+                      output_names=['q_values'], dynamic_axes={'states': {0: 'batch'}, 'q_values': {0: 'batch'}},
+                      dynamo=False)
+
+
+def export_numpy(predictor: Predictor, file_path: str or os.path) -> None:
+    """
+    Function to export Q network weights of saved agent with schema and config to .npz for NumpyPredictor
+
+    :param predictor: predictor of saved agent
+    :param file_path: path to .npz file
+    :return: None
+    """
+
+    state_dict = predictor.return_q_network().state_dict()
+
+    # Weights and biases as float32 arrays, schema and config as json strings (loaded without pickle)
+    arrays = {f'{layer}.{parameter}': state_dict[f'{layer}.{parameter}'].cpu().numpy().astype(np.float32)
+              for layer in LAYERS for parameter in ('weight', 'bias')}
+
+    # Means of training states for imputing missing values
+    if predictor.return_state_means() is not None:
+        arrays['state_means'] = predictor.return_state_means()
+
+    np.savez(file_path, schema=np.array(json.dumps(predictor.return_schema().to_dict())),
+             config=np.array(json.dumps(predictor.return_config())), **arrays)
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from Agent import Agent
+from Dataset import Dataset
+from DQN import create_agent, fit_buffer
+
+
+def combine_state_means(saved: dict, dataset: Dataset) -> tuple[list, int] or None:
+    """
+    Function to return means of states of old and new cases weighted by their rows counts
+
+    :param saved: saved agent data
+    :param dataset: dataset of new cases
+    :return: tuple of means and count of rows (None to take means of new cases if saved agent has no means)
+    """
+
+    if saved.get('state_means') is None:
+        return None
+
+    # Agent saved without rows count keeps its means, so small update does not replace them
+    if saved.get('state_rows') is None:
+        return saved['state_means'], None
+
+    states = dataset.return_arrays()['states']
+    rows = saved['state_rows'] + len(states)
+    means = (np.asarray(saved['state_means'], dtype=np.float64) * saved['state_rows'] +
+             states.sum(axis=0, dtype=np.float64)) / rows
+
+    return [float(mean) for mean in means], rows
+
+
+def incremental_dqn(model_path: str or os.path, file_path: str or os.path, output_path: str or os.path = None,
+                    epochs: int = 10, batch_size: int = 256, replay_size: int = 10000) -> Agent:
+    """
+    Function of warm-start training of saved agent on cases appended to dataset file since it was saved
+
+    :param model_path: path to agent saved with replay_size (fingerprint and replay sample)
+    :param file_path: path to grown dataset file
+    :param output_path: path to updated agent (model_path if None)
+    :param epochs: count of passes over new transitions with replay sample
+    :param batch_size: minibatch size
+    :param replay_size: count of transitions saved for next update
+    :return: updated agent (None if there are no new cases)
+    """
+
+    saved = torch.load(model_path)
+    if 'fingerprint' not in saved:
+        raise ValueError('Agent was saved without fingerprint of training data (save it with replay_size)')
+
+    fingerprint = saved['fingerprint']
+
+    # Lines of new cases only
+    raw = pd.read_pickle(file_path)
+    new_lines = raw[~raw.index.isin(fingerprint['cases'])]
+
+    if new_lines.empty:
+        return None
+
+    # Preprocess only new lines, columns missing in whole case are replaced by stored means
+    dataset = Dataset.from_frame(new_lines, column_means=pd.Series(fingerprint['column_means']))
+
+    if list(dataset.return_schema().return_columns()) != saved['columns']:
+        raise ValueError('New cases have another columns layout')
+
+    # Saved network fine-tuned on new transitions and replay sample of old ones
+    replay = saved.get('replay')
+    agent = create_agent(dataset, saved['config'], buffer_size=dataset.size() + (len(replay[1]) if replay else 0))
+    agent.set_weights(saved['state_dict'])
+    agent.prefill_from_dataset()
+    if replay:
+        agent.return_buffer().add_batch(*[tensor.numpy() for tensor in replay])
+
+    yield from fit_buffer(agent, batch_size=batch_size, epochs=epochs)
+
+    # Fingerprint of old and new cases
+    new_fingerprint = dataset.fingerprint()
+    agent.save(model_path if output_path is None else output_path, saved['config'], replay_size=replay_size,
+               fingerprint={'cases': fingerprint['cases'] + new_fingerprint['cases'],
+                            'column_means': fingerprint['column_means']},
+               state_means=combine_state_means(saved, dataset))
+
+    return agent
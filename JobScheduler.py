@@ -0,0 +1,341 @@
+import os
+import queue
+import shutil
+import threading
+
+from Agent import Agent
+from Dataset import Dataset
+from DQN import CONFIG
+from ModelCache import ModelCache
+from TrainingProcess import TrainingProcess, rebuild_agent
+
+
+class TrainingRegistry:
+    """
+    Class of dataset files being trained, shared by scheduler jobs and Preloader (one training per file at once, so
+    trainings never share checkpoints directory)
+    """
+
+    def __init__(self) -> None:
+        """
+        Function to init registry
+        """
+
+        self.__files = set()
+        self.__condition = threading.Condition()
+
+    def acquire(self, file_path: str or os.path, cancel: threading.Event = None, poll_seconds: float = 0.5) -> bool:
+        """
+        Function to mark file as being trained, waiting until its other training is finished
+
+        :param file_path: path to dataset file
+        :param cancel: event to stop waiting (None to wait without cancelling)
+        :param poll_seconds: time between checks of cancel event in seconds
+        :return: True if file was marked, False if waiting was cancelled
+        """
+
+        file_path = os.path.abspath(file_path)
+
+        with self.__condition:
+            while file_path in self.__files:
+                if cancel is not None and cancel.is_set():
+                    return False
+                self.__condition.wait(poll_seconds)
+
+            self.__files.add(file_path)
+
+        return True
+
+    def try_acquire(self, file_path: str or os.path) -> bool:
+        """
+        Function to mark file as being trained without waiting
+
+        :param file_path: path to dataset file
+        :return: True if file was marked, False if it is already being trained
+        """
+
+        file_path = os.path.abspath(file_path)
+
+        with self.__condition:
+            if file_path in self.__files:
+                return False
+
+            self.__files.add(file_path)
+
+        return True
+
+    def release(self, file_path: str or os.path) -> None:
+        """
+        Function to unmark file after its training
+
+        :param file_path: path to dataset file
+        :return: None
+        """
+
+        with self.__condition:
+            self.__files.discard(os.path.abspath(file_path))
+            self.__condition.notify_all()
+
+
+class Job:
+    """
+    Class of training job of one dataset file
+    """
+
+    def __init__(self, number: int, file_path: str or os.path) -> None:
+        """
+        Function to init job
+
+        :param number: number of job
+        :param file_path: path to dataset file
+        """
+
+        self.__number = number
+        self.__file_path = file_path
+
+        # Status: queued, running, finished, cancelled or failed
+        self.__status = 'queued'
+        self.__progress = None
+        self.__episodes = None
+        self.__agent = None
+        self.__error = None
+
+        self.__cancel = threading.Event()
+        self.__process = None
+
+    def return_number(self) -> int:
+        """
+        Function to return number of job
+
+        :return: number
+        """
+
+        return self.__number
+
+    def return_file_path(self) -> str or os.path:
+        """
+        Function to return path to dataset file of job
+
+        :return: path
+        """
+
+        return self.__file_path
+
+    def return_status(self) -> str:
+        """
+        Function to return status of job
+
+        :return: queued, running, finished, cancelled or failed
+        """
+
+        return self.__status
+
+    def return_progress(self) -> dict or None:
+        """
+        Function to return last progress event of job (later events replace earlier ones)
+
+        :return: dqn event or None
+        """
+
+        return self.__progress
+
+    def return_agent(self) -> Agent or None:
+        """
+        Function to return trained agent of finished job
+
+        :return: agent or None
+        """
+
+        return self.__agent
+
+    def return_error(self) -> str or None:
+        """
+        Function to return error of failed job
+
+        :return: error or None
+        """
+
+        return self.__error
+
+    def cancel(self) -> None:
+        """
+        Function to cancel queued or running job
+
+        :return: None
+        """
+
+        self.__cancel.set()
+        if self.__process is not None:
+            self.__process.cancel()
+
+    def run(self, cache: ModelCache, registry: TrainingRegistry, checkpoints_path: str or os.path, config: dict,
+            threads: int) -> None:
+        """
+        Function to run job in scheduler worker thread: take agent from cache or train it in child process
+
+        :param cache: cache of trained agents
+        :param registry: registry of files being trained
+        :param checkpoints_path: directory of checkpoints of all jobs
+        :param config: training parameters
+        :param threads: count of torch threads of training process
+        :return: None
+        """
+
+        # Job of file trained elsewhere stays queued until that training is finished (its agent is cached then)
+        if self.__cancel.is_set() or not registry.acquire(self.__file_path, self.__cancel):
+            self.__status = 'cancelled'
+            return
+
+        try:
+            self.__run(cache, checkpoints_path, config, threads)
+        finally:
+            registry.release(self.__file_path)
+
+    def __run(self, cache: ModelCache, checkpoints_path: str or os.path, config: dict, threads: int) -> None:
+        """
+        Function to take agent from cache or train it in child process while file is marked as being trained
+
+        :param cache: cache of trained agents
+        :param checkpoints_path: directory of checkpoints of all jobs
+        :param config: training parameters
+        :param threads: count of torch threads of training process
+        :return: None
+        """
+
+        if self.__cancel.is_set():
+            self.__status = 'cancelled'
+            return
+
+        self.__status = 'running'
+
+        try:
+            dataset = Dataset(self.__file_path)
+            key = cache.key(self.__file_path, config)
+
+            agent = cache.load(key, dataset)
+
+            if agent is None:
+                agent = self.__train(dataset, os.path.join(checkpoints_path, key), config, threads)
+
+                if agent is None:
+                    self.__status = 'cancelled'
+                    return
+
+                cache.save(key, agent, config)
+                shutil.rmtree(os.path.join(checkpoints_path, key), ignore_errors=True)
+        except Exception as error:
+            self.__error = repr(error)
+            self.__status = 'failed'
+            return
+
+        self.__agent = agent
+        self.__status = 'finished'
+
+    def __train(self, dataset: Dataset, checkpoints_directory: str or os.path, config: dict,
+                threads: int) -> Agent or None:
+        """
+        Function to train agent in child process keeping last progress event
+
+        :param dataset: dataset object
+        :param checkpoints_directory: directory of checkpoints of job
+        :param config: training parameters
+        :param threads: count of torch threads of training process
+        :return: agent or None if cancelled
+        """
+
+        self.__process = TrainingProcess(self.__file_path, config, checkpoints_directory, threads=threads)
+        if self.__cancel.is_set():
+            self.__process.cancel()
+
+        for event in self.__process.events():
+            if 'error' in event:
+                raise RuntimeError(event['error'])
+            elif event.get('cancelled'):
+                return None
+            elif event.get('finished'):
+                return rebuild_agent(dataset, event['state_dict'], event['schema'], config)
+            elif not event.get('stopped'):
+                self.__progress = event
+
+
+class JobScheduler:
+    """
+    Class of queue of training jobs run by bounded pool of workers (one training process per worker)
+    """
+
+    def __init__(self, cache: ModelCache, checkpoints_path: str or os.path, config: dict = None,
+                 workers: int = None, threads: int = 1, registry: TrainingRegistry = None) -> None:
+        """
+        Function to init scheduler and start workers
+
+        :param cache: cache of trained agents
+        :param checkpoints_path: directory of checkpoints of all jobs
+        :param config: training parameters (CONFIG if None)
+        :param workers: count of jobs run at once (count of cores divided by threads if None)
+        :param threads: count of torch threads of every training process
+        :param registry: registry of files being trained shared with other trainings (own registry if None)
+        """
+
+        self.__cache = cache
+        self.__registry = TrainingRegistry() if registry is None else registry
+        self.__checkpoints_path = checkpoints_path
+        self.__config = CONFIG if config is None else config
+        self.__threads = threads
+        self.__workers = max(1, (os.cpu_count() or 1) // threads) if workers is None else workers
+
+        self.__jobs = []
+        self.__jobs_lock = threading.Lock()
+        self.__queue = queue.Queue()
+
+        for _ in range(self.__workers):
+            threading.Thread(target=self.__work_loop, daemon=True).start()
+
+    def submit(self, file_path: str or os.path) -> Job:
+        """
+        Function to queue training of dataset file (returns existing job if file is queued, running or finished)
+
+        :param file_path: path to dataset file
+        :return: job
+        """
+
+        with self.__jobs_lock:
+            for job in self.__jobs:
+                if job.return_file_path() == file_path and job.return_status() in ('queued', 'running', 'finished'):
+                    return job
+
+            job = Job(len(self.__jobs) + 1, file_path)
+            self.__jobs.append(job)
+
+        self.__queue.put(job)
+
+        return job
+
+    def jobs(self) -> list[Job]:
+        """
+        Function to return all jobs in order of submitting
+
+        :return: list of jobs
+        """
+
+        with self.__jobs_lock:
+            return list(self.__jobs)
+
+    def workers(self) -> int:
+        """
+        Function to return count of jobs run at once
+
+        :return: count of workers
+        """
+
+        return self.__workers
+
+    def __work_loop(self) -> None:
+        """
+        Function of worker thread: run queued jobs one by one
+
+        :return: None
+        """
+
+        while True:
+            job = self.__queue.get()
+            job.run(self.__cache, self.__registry, self.__checkpoints_path, self.__config, self.__threads)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+
+import torch
+
+from Agent import Agent
+from Dataset import Dataset
+from DQN import create_agent
+
+# Version of cached agents layout, increase it to invalidate cache after changes of Dataset/Agent/QNetwork
+SCHEMA_VERSION = 3
+
+
+class ModelCache:
+    """
+    Class of persistent cache of trained agents with LRU eviction by size (safe for threads sharing the object, files
+    removed by other processes are cache misses)
+    """
+
+    def __init__(self, directory: str or os.path, max_bytes: int = 500 * 1024 ** 2) -> None:
+        """
+        Function to init cache
+
+        :param directory: cache directory
+        :param max_bytes: maximum size of cache in bytes
+        """
+
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+
+        # Lock of loads, saves and evictions of all threads (UI, Preloader and scheduler workers)
+        self.__lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(file_path: str or os.path, config: dict) -> str:
+        """
+        Function to return cache key by dataset file contents and training parameters
+
+        :param file_path: path to dataset file
+        :param config: training parameters
+        :return: key
+        """
+
+        digest = hashlib.sha256()
+
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 ** 2), b''):
+                digest.update(chunk)
+
+        digest.update(json.dumps(config, sort_keys=True).encode())
+        digest.update(str(SCHEMA_VERSION).encode())
+
+        return digest.hexdigest()
+
+    def load(self, key: str, dataset: Dataset) -> Agent or None:
+        """
+        Function to load cached agent
+
+        :param key: cache key
+        :param dataset: dataset of agent
+        :return: agent (None if there is no valid cached agent)
+        """
+
+        path = self.__path(key)
+
+        with self.__lock:
+            if not os.path.isfile(path):
+                return None
+
+            try:
+                saved = torch.load(path)
+
+                if saved['config'].get('schema_version') != SCHEMA_VERSION:
+                    raise ValueError('Cached agent has old schema')
+
+                agent = create_agent(dataset, saved['config'], buffer_size=1)
+                agent.load_state(saved)
+            except FileNotFoundError:
+                return None
+            except Exception:
+                self.__remove(path)
+                return None
+
+            # Mark as recently used
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+        return agent
+
+    def save(self, key: str, agent: Agent, config: dict) -> None:
+        """
+        Function to save agent in cache
+
+        :param key: cache key
+        :param agent: trained agent
+        :param config: training parameters
+        :return: None
+        """
+
+        path = self.__path(key)
+
+        # Temporary file of this process, other processes may save the same key
+        temp_path = f'{path}.{os.getpid()}.tmp'
+
+        with self.__lock:
+            agent.save(temp_path, config={**config, 'schema_version': SCHEMA_VERSION})
+            os.replace(temp_path, path)
+
+            self.__evict()
+
+    def __path(self, key: str) -> str:
+        """
+        Function to return path of cached agent
+
+        :param key: cache key
+        :return: path
+        """
+
+        return os.path.join(self.__directory, f'{key}.pt')
+
+    def __evict(self) -> None:
+        """
+        Function to remove least recently used agents while cache is bigger than maximum size
+
+        :return: None
+        """
+
+        # Modification times and sizes of agents which still exist
+        files = []
+        for name in os.listdir(self.__directory):
+            if name.endswith('.pt'):
+                path = os.path.join(self.__directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in files[:-1]:
+            if total <= self.__max_bytes:
+                break
+            total -= size
+            self.__remove(path)
+
+    @staticmethod
+    def __remove(path: str) -> None:
+        """
+        Function to remove cached agent which may be already removed
+
+        :param path: path of cached agent
+        :return: None
+        """
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+
+from DatasetSchema import DatasetSchema
+
+
+class NumpyPredictor:
+    """
+    Class of prediction-only model on NumPy by weights exported with export_numpy (torch is not imported)
+    """
+
+    def __init__(self, file_path: str or os.path) -> None:
+        """
+        Function to init predictor by .npz file of export_numpy
+
+        :param file_path: path to exported weights
+        """
+
+        with np.load(file_path, allow_pickle=False) as saved:
+            # Columns layout of training dataset and training parameters
+            self.__schema = DatasetSchema.from_dict(json.loads(saved['schema'].item()))
+            self.__config = json.loads(saved['config'].item())
+            self.__state_means = saved['state_means'] if 'state_means' in saved.files else None
+
+            # Transposed weights for states (rows x features) @ weights
+            self.__layers = [(np.ascontiguousarray(saved[f'{layer}.weight'].T), saved[f'{layer}.bias'])
+                             for layer in ('layer_1', 'layer_2', 'layer_3')]
+
+    def q_values(self, states: list or np.array) -> np.ndarray:
+        """
+        Function to return Q values of states by three linear layers with ReLU between them
+
+        :param states: state or batch of states
+        :return: Q values
+        """
+
+        x = np.asarray(states, dtype=np.float32)
+
+        for position, (weight, bias) in enumerate(self.__layers):
+            x = x @ weight
+            x += bias
+
+            if position < len(self.__layers) - 1:
+                np.maximum(x, 0, out=x)
+
+        return x
+
+    def predict_batch(self, states: np.ndarray) -> tuple[list[str], np.ndarray]:
+        """
+        Function to return predicts for batch of states
+
+        :param states: states (rows x state dimensional)
+        :return: tuple of actions names and Q values
+        """
+
+        q_values = self.q_values(states)
+        action_names = self.__schema.return_action_names()
+
+        return [action_names[action] for action in q_values.argmax(axis=-1)], q_values
+
+    def return_schema(self) -> DatasetSchema:
+        """
+        Function to return columns layout of training dataset
+
+        :return: dataset schema
+        """
+
+        return self.__schema
+
+    def return_state_means(self) -> np.ndarray or None:
+        """
+        Function to return means of training states for imputing missing values
+
+        :return: means by state column (None if not exported with agent)
+        """
+
+        return self.__state_means
+
+    def return_config(self) -> dict:
+        """
+        Function to return training parameters of exported agent
+
+        :return: training parameters
+        """
+
+        return self.__config
+
+
+def impute_states(states: np.ndarray, state_means: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function to replace missing values of states by means of training states
+
+    :param states: states (rows x state dimensional)
+    :param state_means: means of training states (None if not saved with model)
+    :return: tuple of states and mask of rows which had missing values
+    """
+
+    states = np.array(states, dtype=np.float32)
+    missing = np.isnan(states)
+
+    if state_means is not None:
+        states = np.where(missing, state_means, states)
+
+    return states, missing.any(axis=1)
+
+
+def load_predictor(file_path: str or os.path) -> 'NumpyPredictor or Predictor':
+    """
+    Function to load predictor by file type: NumpyPredictor for .npz (without torch), else Predictor
+
+    :param file_path: path to exported weights or saved agent
+    :return: predictor
+    """
+
+    if str(file_path).endswith('.npz'):
+        return NumpyPredictor(file_path)
+
+    from Predictor import Predictor
+
+    return Predictor(file_path)
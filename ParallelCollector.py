@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import queue
+import time
+
+import numpy as np
+import torch
+
+from Agent import Agent
+from Dataset import Dataset
+from DQN import create_agent, episode_metrics, CONFIG
+
+
+def collect(file_path: str or os.path, cases: list, config: dict, snapshots: multiprocessing.Queue,
+            transitions: multiprocessing.Queue) -> None:
+    """
+    Function of collecting worker: epsilon-greedy rollouts over shard of cases with synced Q network snapshots
+
+    :param file_path: path to dataset file (preprocessed cache is memory-mapped, so workers share its pages)
+    :param cases: numbers of cases of worker shard
+    :param config: training parameters
+    :param snapshots: queue of Q network state_dicts from learner
+    :param transitions: queue of collected transitions with epsilon of their rollout to learner
+    :return: None
+    """
+
+    # One torch thread per worker
+    torch.set_num_threads(1)
+
+    agent = create_agent(Dataset(file_path), config, buffer_size=1)
+    epsilon = config['start_epsilon']
+
+    for case_num in cases:
+
+        # Take latest snapshot of learner network
+        state_dict = None
+        while True:
+            try:
+                state_dict = snapshots.get_nowait()
+            except queue.Empty:
+                break
+        if state_dict is not None:
+            agent.set_weights(state_dict)
+
+        transitions.put((agent.rollout(epsilon, case_num), epsilon))
+
+        epsilon = max(config['end_epsilon'], epsilon * config['epsilon_decay'])
+
+    # End of shard
+    transitions.put(None)
+
+
+def put_latest(snapshots: multiprocessing.Queue, state_dict: dict) -> None:
+    """
+    Function to put snapshot in one-slot queue replacing stale snapshot not taken by worker
+
+    :param snapshots: queue of Q network state_dicts of worker
+    :param state_dict: Q network state_dict
+    :return: None
+    """
+
+    while True:
+        try:
+            snapshots.put_nowait(state_dict)
+            return
+        except queue.Full:
+            try:
+                snapshots.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def parallel_dqn(file_path: str or os.path, workers: int = 4, config: dict = None, sync_every: int = 10,
+                 poll_seconds: float = 1.0) -> Agent:
+    """
+    Function of dqn learning with experience collection in worker processes and one central learner
+
+    Every learned episode yields the same metrics as dqn (epsilon of worker which collected it)
+
+    :param file_path: path to dataset file
+    :param workers: count of collecting processes
+    :param config: training parameters (missing ones are taken from CONFIG)
+    :param sync_every: learner episodes between sending of Q network snapshots to workers
+    :param poll_seconds: seconds of waiting for transitions between checks that workers are alive
+    :return: trained agent
+    """
+
+    config = {**CONFIG, **(config or {})}
+
+    # Learner agent (also writes preprocessed cache for workers)
+    dataset = Dataset(file_path)
+    agent = create_agent(dataset, config)
+
+    # Workers with interleaved shards of cases
+    context = multiprocessing.get_context('spawn')
+    transitions = context.Queue(maxsize=workers * 16)
+    snapshots = [context.Queue(maxsize=1) for _ in range(workers)]
+    processes = [context.Process(target=collect, args=(file_path, list(range(worker, dataset.episodes_count(), workers)),
+                                                       config, snapshots[worker], transitions), daemon=True)
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        finished = 0
+        episode = 0
+
+        # Throughput parameters
+        start_time = time.perf_counter()
+        rows = 0
+
+        while finished < workers:
+            # Dead worker never sends its end of shard
+            for worker, process in enumerate(processes):
+                if process.exitcode not in (None, 0):
+                    raise RuntimeError(f'Collecting worker {worker} died with exit code {process.exitcode}')
+
+            try:
+                item = transitions.get(timeout=poll_seconds)
+            except queue.Empty:
+                continue
+
+            if item is None:
+                finished += 1
+                continue
+
+            episode_transitions, epsilon = item
+
+            optimizer_steps = agent.return_optimizer_steps()
+            agent.learn(*episode_transitions)
+            episode += 1
+            rows += len(episode_transitions[2])
+
+            # Sync workers networks
+            if episode % sync_every == 0:
+                state_dict = {name: tensor.clone() for name, tensor in agent.return_q_network().state_dict().items()}
+                for snapshot in snapshots:
+                    put_latest(snapshot, state_dict)
+
+            yield episode_metrics(agent, episode, dataset.episodes_count(), rows, dataset.size(), 0, start_time,
+                                  epsilon, np.mean(episode_transitions[2]),
+                                  agent.return_optimizer_steps() - optimizer_steps)
+    finally:
+        # Queues are not flushed to terminated workers
+        for worker_queue in snapshots + [transitions]:
+            worker_queue.cancel_join_thread()
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    return agent
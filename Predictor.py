@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import torch
+
+from DatasetSchema import DatasetSchema
+from QNetwork import QNetwork
+
+
+class Predictor:
+    """
+    Class of prediction-only model loaded from saved agent (without dataset and environment)
+    """
+
+    def __init__(self, file_path: str or os.path) -> None:
+        """
+        Function to init predictor by file saved with Agent.save
+
+        :param file_path: path to saved agent
+        """
+
+        saved = torch.load(file_path)
+
+        # Columns layout of training dataset
+        self.__schema = DatasetSchema(saved['columns'])
+        self.__config = saved['config']
+
+        # Means of training states (None for agents saved before they were stored)
+        self.__state_means = None if saved.get('state_means') is None else \
+            np.asarray(saved['state_means'], dtype=np.float32)
+
+        # Q network with saved weights
+        state_dict = saved['state_dict']
+        self.__q_network = QNetwork(self.__schema.state_dim(), self.__schema.action_dim(),
+                                    n_hidden_neurons=state_dict['layer_1.weight'].shape[0])
+        self.__q_network.load_state_dict(state_dict)
+        self.__q_network.eval()
+
+    def predict_batch(self, states: np.ndarray) -> tuple[list[str], np.ndarray]:
+        """
+        Function to return predicts for batch of states in one forward pass
+
+        :param states: states (rows x state dimensional)
+        :return: tuple of actions names and Q values
+        """
+
+        actions, q_values = self.__q_network.predict_batch(states)
+        action_names = self.__schema.return_action_names()
+
+        return [action_names[action] for action in actions], q_values
+
+    def return_q_network(self) -> QNetwork:
+        """
+        Function to return Q network with saved weights
+
+        :return: Q network
+        """
+
+        return self.__q_network
+
+    def return_schema(self) -> DatasetSchema:
+        """
+        Function to return columns layout of training dataset
+
+        :return: dataset schema
+        """
+
+        return self.__schema
+
+    def return_state_means(self) -> np.ndarray or None:
+        """
+        Function to return means of training states for imputing missing values
+
+        :return: means by state column (None if not saved with agent)
+        """
+
+        return self.__state_means
+
+    def return_config(self) -> dict:
+        """
+        Function to return training parameters of saved agent
+
+        :return: training parameters
+        """
+
+        return self.__config
@@ -0,0 +1,116 @@
+import numpy as np
+import torch
+
+from Buffer import Buffer
+from SumTree import SumTree
+
+
+class PrioritizedBuffer(Buffer):
+    """
+    Class of model experience buffer with prioritized sampling by TD errors
+    """
+
+    def __init__(self, max_size: int, state_dim: int, alpha: float = 0.6, beta: float = 0.4,
+                 min_priority: float = 1e-6) -> None:
+        """
+        Function to init buffer
+
+        :param max_size: maximum size of buffer
+        :param state_dim: dimensional of states
+        :param alpha: priority exponent (0 for uniform sampling)
+        :param beta: importance-sampling exponent (1 for full correction)
+        :param min_priority: priority added to TD errors so every element can be sampled
+        """
+
+        super(PrioritizedBuffer, self).__init__(max_size, state_dim)
+
+        self.__alpha = alpha
+        self.__beta = beta
+        self.__min_priority = min_priority
+
+        # Priorities of elements, new elements get maximum priority
+        self.__tree = SumTree(max_size)
+        self.__max_priority = 1.0
+
+        self.__rng = np.random.default_rng()
+
+    def add(self, state: list or np.array, action: int, reward: float, next_state: list or np.array,
+            done: bool) -> int:
+        """
+        Function to append new buffer element with maximum priority
+
+        :param state: current state
+        :param action: action
+        :param reward: reward for action
+        :param next_state: next state
+        :param done: done or no
+        :return: position of element in buffer
+        """
+
+        position = super(PrioritizedBuffer, self).add(state, action, reward, next_state, done)
+        self.__tree.update(np.array([position]), self.__max_priority ** self.__alpha)
+
+        return position
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                  dones: np.ndarray) -> np.ndarray:
+        """
+        Function to append many buffer elements at once with maximum priority
+
+        :param states: current states
+        :param actions: actions
+        :param rewards: rewards for actions
+        :param next_states: next states
+        :param dones: dones
+        :return: positions of elements in buffer
+        """
+
+        positions = super(PrioritizedBuffer, self).add_batch(states, actions, rewards, next_states, dones)
+        self.__tree.update(positions, self.__max_priority ** self.__alpha)
+
+        return positions
+
+    def sample(self, batch_size: int) -> tuple:
+        """
+        Function to return samples of buffer proportionally to priorities
+
+        :param batch_size: batch size
+        :return: tensors of states, actions, rewards, next states, dones, importance-sampling weights (columns)
+                 and positions of elements
+        """
+
+        # One value in every of batch_size equal segments of priorities sum
+        total = self.__tree.total()
+        values = (np.arange(batch_size) + self.__rng.random(batch_size)) * total / batch_size
+        indices = np.minimum(self.__tree.find(values), len(self) - 1)
+
+        # Importance-sampling weights normalized by maximum
+        probabilities = self.__tree.priorities(indices) / total
+        weights = (len(self) * probabilities) ** -self.__beta
+        weights /= weights.max()
+
+        return (*self.gather(indices), torch.from_numpy(weights.astype(np.float32)).unsqueeze(1), indices)
+
+    def load_state(self, state: dict) -> None:
+        """
+        Function to restore buffer contents returned by return_state (priorities are reset to maximum)
+
+        :param state: dictionary of filled part of arrays with ring position
+        :return: None
+        """
+
+        super(PrioritizedBuffer, self).load_state(state)
+        self.__tree.update(np.arange(len(self)), self.__max_priority ** self.__alpha)
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        """
+        Function to set priorities of sampled elements by their TD errors
+
+        :param indices: positions of elements
+        :param td_errors: TD errors
+        :return: None
+        """
+
+        priorities = np.abs(td_errors) + self.__min_priority
+        self.__max_priority = max(self.__max_priority, priorities.max())
+        self.__tree.update(indices, priorities ** self.__alpha)
@@ -0,0 +1,103 @@
+import queue
+import tkinter as tk
+
+# Default refresh rate of user interface
+REFRESH_MS = 100
+
+
+class ProgressBridge:
+    """
+    Class of bounded queue passing events from training thread to Tk main loop polled by after()
+    """
+
+    def __init__(self, widget: tk.Misc, callback, refresh_ms: int = REFRESH_MS, max_size: int = 64) -> None:
+        """
+        Function to init bridge
+
+        :param widget: widget whose after() schedules polling on main thread
+        :param callback: function called on main thread for every delivered event
+        :param refresh_ms: milliseconds between polls
+        :param max_size: maximum count of pending events
+        """
+
+        self.__widget = widget
+        self.__callback = callback
+        self.__refresh_ms = refresh_ms
+        self.__events = queue.Queue(maxsize=max_size)
+        self.__after_id = None
+
+    def post(self, event: dict, coalesce: bool = True) -> None:
+        """
+        Function to post event from training thread
+
+        :param event: event
+        :param coalesce: event may be replaced by later one (progress), else it is always delivered (blocks if full)
+        :return: None
+        """
+
+        if not coalesce:
+            self.__events.put((False, event))
+            return
+
+        # Progress is dropped when main thread is behind, the later one is shown instead
+        try:
+            self.__events.put_nowait((True, event))
+        except queue.Full:
+            pass
+
+    def drain(self) -> list:
+        """
+        Function to take all pending events keeping only last of every run of coalescing ones
+
+        :return: list of events in order of posting
+        """
+
+        pending = []
+        while True:
+            try:
+                pending.append(self.__events.get_nowait())
+            except queue.Empty:
+                break
+
+        return [event for position, (coalesce, event) in enumerate(pending)
+                if not coalesce or position + 1 == len(pending) or not pending[position + 1][0]]
+
+    def start(self) -> None:
+        """
+        Function to start polling on main thread
+
+        :return: None
+        """
+
+        self.__after_id = self.__widget.after(self.__refresh_ms, self.poll)
+
+    def poll(self) -> None:
+        """
+        Function to deliver pending events to callback and schedule next poll (main thread)
+
+        :return: None
+        """
+
+        self.__after_id = None
+
+        for event in self.drain():
+            self.__callback(event)
+
+            # Callback may stop polling, for example by switching frame
+            if self.__widget is None:
+                return
+
+        self.__after_id = self.__widget.after(self.__refresh_ms, self.poll)
+
+    def stop(self) -> None:
+        """
+        Function to stop polling
+
+        :return: None
+        """
+
+        if self.__after_id is not None:
+            self.__widget.after_cancel(self.__after_id)
+            self.__after_id = None
+
+        self.__widget = None
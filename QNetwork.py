@@ -40,22 +40,40 @@ class QNetwork(nn.Module):
 
         return x
 
-    def predict(self, x: list or np.array) -> int:
+    def q_values(self, x: list or np.array) -> np.ndarray:
         """
-        Function to make predict by network
+        Function to return Q values of states without gradients
 
-        :param x: input state
-        :param device: torch device
-        :return: output state
+        :param x: input state or batch of states
+        :return: Q values
         """
 
-        device = ('cuda' if torch.cuda.is_available() else 'cpu')
+        # Input on device of network weights (without copy for float32 arrays on cpu)
+        x = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)).to(self.layer_1.weight.device)
 
-        x = torch.tensor(x, dtype=torch.float32).to(device)
-        
         with torch.no_grad():
             x = self.forward(x)
-        x = x.cpu().argmax(dim=-1)
-        x = x.data.numpy()
 
-        return x
+        return x.cpu().numpy()
+
+    def predict_batch(self, x: list or np.array) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Function to make predicts by network for batch of states in one forward pass
+
+        :param x: batch of states
+        :return: tuple of best actions and Q values
+        """
+
+        q_values = self.q_values(x)
+
+        return q_values.argmax(axis=-1), q_values
+
+    def predict(self, x: list or np.array) -> int:
+        """
+        Function to make predict by network
+
+        :param x: input state
+        :return: output state
+        """
+
+        return self.predict_batch(x)[0]
@@ -1,19 +1,119 @@
+import json
+import os
 import time
+from collections import defaultdict
+from contextlib import nullcontext
 
+# Shared context of disabled tracker
+DISABLED = nullcontext()
 
-class RunningTracker:
 
-    def __init__(self, func):
-        self.func = func
-        self.result = None
+class PhaseTimer:
+    """
+    Class of context manager adding running time of block to phase of tracker
+    """
+
+    def __init__(self, tracker: 'RunningTracker', phase: str) -> None:
+        """
+        Function to init timer
+
+        :param tracker: tracker
+        :param phase: name of phase
+        """
+
+        self.tracker = tracker
+        self.phase = phase
+        self.start_time = None
 
-    def __enter__(self):
-        self.start_time = time.time()
+    def __enter__(self) -> 'PhaseTimer':
+        self.start_time = time.perf_counter()
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is None:
-            self.result = self.func()
-            self.end_time = time.time()
-        else:
-            return False
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.tracker.add(self.phase, time.perf_counter() - self.start_time)
+        return False
+
+
+class RunningTracker:
+    """
+    Class of training telemetry: running times of hot path phases and JSONL stream of metrics events
+    """
+
+    def __init__(self, enabled: bool = True, file_path: str or os.path = None) -> None:
+        """
+        Function to init tracker
+
+        :param enabled: track phases and write events (disabled tracker costs one call per phase)
+        :param file_path: path to .jsonl file of events (None to keep events in memory only)
+        """
+
+        self.enabled = enabled
+
+        # Running times and counts of phases since last snapshot
+        self.__times = defaultdict(float)
+        self.__counts = defaultdict(int)
+
+        self.__file = open(file_path, 'a') if enabled and file_path is not None else None
+
+    def track(self, phase: str) -> PhaseTimer or nullcontext:
+        """
+        Function to return context manager measuring running time of phase
+
+        :param phase: name of phase (env_step, buffer_add, sample, tensorize, forward, backward, optimizer_step...)
+        :return: context manager
+        """
+
+        if not self.enabled:
+            return DISABLED
+
+        return PhaseTimer(self, phase)
+
+    def add(self, phase: str, seconds: float) -> None:
+        """
+        Function to add running time to phase
+
+        :param phase: name of phase
+        :param seconds: running time in seconds
+        :return: None
+        """
+
+        self.__times[phase] += seconds
+        self.__counts[phase] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Function to return running times of phases since last snapshot and reset them
+
+        :return: dictionary by phase of total milliseconds and count of calls
+        """
+
+        phases = {phase: {'ms': seconds * 1000, 'count': self.__counts[phase]} for phase, seconds in
+                  self.__times.items()}
+
+        self.__times.clear()
+        self.__counts.clear()
+
+        return phases
+
+    def emit(self, event: dict) -> None:
+        """
+        Function to write metrics event as line of .jsonl file
+
+        :param event: dictionary of metrics
+        :return: None
+        """
+
+        if self.__file is not None:
+            self.__file.write(json.dumps({'time': time.time(), **event}, default=float) + '\n')
+            self.__file.flush()
+
+    def close(self) -> None:
+        """
+        Function to close events file
+
+        :return: None
+        """
+
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
@@ -0,0 +1,287 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from NumpyPredictor import load_predictor, impute_states
+
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    """
+    Class of threading HTTP server with listen backlog for many concurrent clients
+    """
+
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class PendingRequest:
+    """
+    Class of prediction request waiting for its micro-batch
+    """
+
+    def __init__(self, states: np.ndarray) -> None:
+        """
+        Function to init request
+
+        :param states: states of request (rows x state dimensional)
+        """
+
+        self.states = states
+        self.start_time = time.perf_counter()
+        self.done = threading.Event()
+        self.treatments = None
+        self.q_values = None
+        self.error = None
+
+
+class PredictionServer:
+    """
+    Class of local HTTP/JSON prediction server gathering concurrent requests into micro-batches
+    """
+
+    def __init__(self, model_path: str or os.path, host: str = '127.0.0.1', port: int = 8000,
+                 max_batch_size: int = 256, max_wait_ms: float = 5.0, request_timeout: float = 30.0) -> None:
+        """
+        Function to init server
+
+        :param model_path: path to saved agent or .npz of export_numpy (served without torch)
+        :param host: host to listen (localhost only by default)
+        :param port: port to listen
+        :param max_batch_size: maximum count of states in one forward pass
+        :param max_wait_ms: maximum time to wait for filling of micro-batch in milliseconds
+        :param request_timeout: maximum time to wait for predicts of one request in seconds
+        """
+
+        self.__predictor = load_predictor(model_path)
+        self.__state_dim = self.__predictor.return_schema().state_dim()
+        self.__state_means = self.__predictor.return_state_means()
+
+        self.__max_batch_size = max_batch_size
+        self.__max_wait = max_wait_ms / 1000
+        self.__request_timeout = request_timeout
+
+        # Requests waiting for batching
+        self.__requests = queue.Queue()
+
+        # Statistics of latencies (milliseconds) and batch sizes
+        self.__latencies = deque(maxlen=100000)
+        self.__batch_sizes = Counter()
+        self.__lock = threading.Lock()
+
+        self.__http = LocalHTTPServer((host, port), self.__handler())
+
+        self.__batcher = threading.Thread(target=self.__batch_loop, daemon=True)
+
+    def serve_forever(self) -> None:
+        """
+        Function to start batching thread and serve requests until shutdown
+
+        :return: None
+        """
+
+        self.__batcher.start()
+        self.__http.serve_forever()
+
+    def shutdown(self) -> None:
+        """
+        Function to stop server
+
+        :return: None
+        """
+
+        self.__http.shutdown()
+        self.__http.server_close()
+
+    def address(self) -> tuple[str, int]:
+        """
+        Function to return address of server
+
+        :return: tuple of host and port
+        """
+
+        return self.__http.server_address[:2]
+
+    def state_dim(self) -> int:
+        """
+        Function to return state dimensional of served agent
+
+        :return: state dimensional
+        """
+
+        return self.__state_dim
+
+    def state_means(self) -> np.ndarray or None:
+        """
+        Function to return means of training states of served agent for missing values
+
+        :return: means (None if not saved with model)
+        """
+
+        return self.__state_means
+
+    def predict(self, states: np.ndarray) -> tuple[list[str], np.ndarray]:
+        """
+        Function to put states in micro-batch queue and wait for predicts
+
+        :param states: states (rows x state dimensional)
+        :return: tuple of actions names and Q values
+        """
+
+        # Large requests are split, so one micro-batch never exceeds maximum batch size
+        requests = [PendingRequest(states[start:start + self.__max_batch_size])
+                    for start in range(0, max(len(states), 1), self.__max_batch_size)]
+        for request in requests:
+            self.__requests.put(request)
+
+        deadline = time.perf_counter() + self.__request_timeout
+        for request in requests:
+            if not request.done.wait(max(deadline - time.perf_counter(), 0)):
+                raise TimeoutError(f'predicts were not ready in {self.__request_timeout} s')
+            if request.error is not None:
+                raise RuntimeError(request.error)
+
+        return [treatment for request in requests for treatment in request.treatments], \
+            np.concatenate([request.q_values for request in requests])
+
+    def stats(self) -> dict:
+        """
+        Function to return latency percentiles and batch sizes histogram
+
+        :return: dictionary of statistics
+        """
+
+        with self.__lock:
+            latencies = np.array(self.__latencies)
+            batch_sizes = dict(sorted(self.__batch_sizes.items()))
+
+        return {'requests': len(latencies),
+                'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'batch_sizes': {f'<={size}': count for size, count in batch_sizes.items()}}
+
+    def __batch_loop(self) -> None:
+        """
+        Function of batching thread: gather requests until maximum batch size or waiting time, predict them at once
+
+        :return: None
+        """
+
+        # Request which did not fit in previous batch
+        carry = None
+
+        while True:
+            requests = [self.__requests.get() if carry is None else carry]
+            carry = None
+            count = len(requests[0].states)
+            deadline = time.perf_counter() + self.__max_wait
+
+            while count < self.__max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.__requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if count + len(request.states) > self.__max_batch_size:
+                    carry = request
+                    break
+                requests.append(request)
+                count += len(request.states)
+
+            # Failed batch fails its requests, batching thread keeps running
+            try:
+                treatments, q_values = self.__predictor.predict_batch(np.concatenate([request.states
+                                                                                      for request in requests]))
+            except Exception as e:
+                for request in requests:
+                    request.error = f'prediction failed: {e!r}'
+                    request.done.set()
+                continue
+
+            start = 0
+            finish_time = time.perf_counter()
+            with self.__lock:
+                # Histogram by power of two buckets
+                self.__batch_sizes[1 << (count - 1).bit_length()] += 1
+                for request in requests:
+                    self.__latencies.append((finish_time - request.start_time) * 1000)
+
+            for request in requests:
+                end = start + len(request.states)
+                request.treatments, request.q_values = treatments[start:end], q_values[start:end]
+                request.done.set()
+                start = end
+
+    def __handler(self) -> type:
+        """
+        Function to return HTTP handler class bound to server
+
+        :return: handler class
+        """
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self.reply(200, server.stats())
+                else:
+                    self.reply(404, {'error': 'unknown path'})
+
+            def do_POST(self):
+                if self.path != '/predict':
+                    self.reply(404, {'error': 'unknown path'})
+                    return
+
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    states = np.asarray(body['states'] if 'states' in body else [body['state']], dtype=np.float32)
+                    if states.ndim != 2 or states.shape[1] != server.state_dim():
+                        raise ValueError(f'states must have {server.state_dim()} values')
+                    if np.isinf(states).any():
+                        raise ValueError('states must be finite')
+
+                    # Missing values (NaN) are replaced by training means as in predict command
+                    states, imputed = impute_states(states, server.state_means())
+                    if imputed.any() and server.state_means() is None:
+                        raise ValueError('states have missing values and model has no training means')
+                except (KeyError, TypeError, ValueError) as e:
+                    self.reply(400, {'error': str(e)})
+                    return
+
+                try:
+                    treatments, q_values = server.predict(states)
+                except TimeoutError as e:
+                    self.reply(504, {'error': str(e)})
+                    return
+                except RuntimeError as e:
+                    self.reply(500, {'error': str(e)})
+                    return
+
+                if not np.isfinite(q_values).all():
+                    self.reply(500, {'error': 'model returned non-finite Q values'})
+                    return
+
+                self.reply(200, {'treatments': treatments, 'q_values': q_values.tolist(), 'imputed': imputed.tolist()})
+
+            def reply(self, code, data):
+                # Strict JSON, NaN and infinity are never written
+                content = json.dumps(data, allow_nan=False).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
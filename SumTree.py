@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class SumTree:
+    """
+    Class of array-based sum tree of priorities (O(log n) batched updates and prefix sum search)
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Function to init tree
+
+        :param capacity: count of leaves
+        """
+
+        # Leaves count rounded up to power of two, node i has children 2i and 2i + 1, root is 1
+        self.__leaves = 1 << max(capacity - 1, 0).bit_length()
+        self.__depth = self.__leaves.bit_length() - 1
+        self.__tree = np.zeros(2 * self.__leaves, dtype=np.float64)
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """
+        Function to set priorities of leaves and update sums of their parents
+
+        :param indices: leaves indices
+        :param priorities: new priorities
+        :return: None
+        """
+
+        nodes = np.asarray(indices) + self.__leaves
+        self.__tree[nodes] = priorities
+
+        # Update parents level by level
+        for _ in range(self.__depth):
+            nodes = np.unique(nodes // 2)
+            self.__tree[nodes] = self.__tree[2 * nodes] + self.__tree[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """
+        Function to find leaves by prefix sums of priorities
+
+        :param values: prefix sums in [0, total)
+        :return: leaves indices
+        """
+
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+
+        # Descend level by level for all values at once
+        for _ in range(self.__depth):
+            left = 2 * nodes
+            right = values >= self.__tree[left]
+            values = np.where(right, values - self.__tree[left], values)
+            nodes = np.where(right, left + 1, left)
+
+        return nodes - self.__leaves
+
+    def priorities(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Function to return priorities of leaves
+
+        :param indices: leaves indices
+        :return: priorities
+        """
+
+        return self.__tree[np.asarray(indices) + self.__leaves]
+
+    def total(self) -> float:
+        """
+        Function to return sum of all priorities
+
+        :return: sum of priorities
+        """
+
+        return self.__tree[1]
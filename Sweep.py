@@ -0,0 +1,157 @@
+import itertools
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import torch
+
+from ConvergenceMonitor import ConvergenceMonitor
+from CrossValidation import evaluate, split_cases
+from Dataset import Dataset
+from DQN import dqn, CONFIG
+
+# Training and held-out datasets of worker process (memory-mapped preprocessed cache, loaded once per worker)
+WORKER_DATASET = None
+WORKER_VALIDATION_DATASET = None
+
+# Default search space of sweep
+SPACE = {'lr': [1e-4, 1e-3],
+         'batch_size': [32, 64],
+         'buffer_size': [10000, 100000]}
+
+
+def grid_search(space: dict) -> list[dict]:
+    """
+    Function to return all combinations of training parameters
+
+    :param space: dictionary of lists of values by parameter
+    :return: list of configs
+    """
+
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_search(space: dict, count: int, seed: int = None) -> list[dict]:
+    """
+    Function to return random combinations of training parameters
+
+    :param space: dictionary by parameter of list of values (random choice) or (low, high) tuple (uniform value,
+    integer if both bounds are integers)
+    :param count: count of configs
+    :param seed: random seed
+    :return: list of configs
+    """
+
+    rng = random.Random(seed)
+
+    def sample(values):
+        if not isinstance(values, tuple):
+            return rng.choice(values)
+        if all(isinstance(value, int) for value in values):
+            return rng.randint(*values)
+        return rng.uniform(*values)
+
+    return [{parameter: sample(values) for parameter, values in space.items()} for _ in range(count)]
+
+
+def init_worker(file_path: str or os.path, threads: int, validation_cases: np.ndarray) -> None:
+    """
+    Function to init sweep worker process: limit torch threads and map preprocessed dataset once
+
+    :param file_path: path to dataset file
+    :param threads: count of torch threads of worker
+    :param validation_cases: numbers of held-out cases
+    :return: None
+    """
+
+    global WORKER_DATASET, WORKER_VALIDATION_DATASET
+
+    torch.set_num_threads(threads)
+    dataset = Dataset(file_path)
+
+    WORKER_DATASET = dataset.subset(np.setdiff1d(np.arange(dataset.episodes_count()), validation_cases))
+    WORKER_VALIDATION_DATASET = dataset.subset(validation_cases)
+
+
+def run_config(run: int, config: dict, output_dir: str or os.path, early_stopping: bool = False) -> dict:
+    """
+    Function to train agent by one config in worker process, evaluate it on held-out cases and save it
+
+    :param run: number of run
+    :param config: training parameters
+    :param output_dir: directory for saved agents
+    :param early_stopping: stop training by convergence monitor
+    :return: dictionary of config, held-out metrics, wall time and path of saved agent
+    """
+
+    start_time = time.perf_counter()
+
+    config = {**CONFIG, **config}
+    gen = dqn(WORKER_DATASET, config, monitor=ConvergenceMonitor() if early_stopping else None)
+    episodes = 0
+
+    while True:
+        try:
+            value = next(gen)
+        except StopIteration as e:
+            agent = e.value
+            break
+
+        if 'reward' in value:
+            episodes += 1
+
+    path = os.path.join(output_dir, f'run_{run}.pt')
+    agent.save(path, config)
+
+    # Reward of logged data does not depend on chosen action, so configs are ranked by held-out metrics
+    metrics = evaluate(agent, WORKER_VALIDATION_DATASET, config['gamma'])
+
+    return {'run': run, **config, 'episodes': episodes,
+            'score': metrics['agreement_good_outcome'] - metrics['agreement_bad_outcome'], **metrics,
+            'time': time.perf_counter() - start_time, 'path': path}
+
+
+def sweep(file_path: str or os.path, configs: list[dict], output_dir: str or os.path, workers: int = None,
+          threads: int = 1, early_stopping: bool = False, validation: float = 0.2, seed: int = 0) -> pd.DataFrame:
+    """
+    Function to train agents by configs in process pool, write results table and save best agent
+
+    :param file_path: path to dataset file
+    :param configs: list of training parameters
+    :param output_dir: directory for results.csv, saved agents and best.pt
+    :param workers: count of worker processes (count of cores divided by threads if None)
+    :param threads: count of torch threads of every worker
+    :param early_stopping: stop training by convergence monitor
+    :param validation: share of held-out cases for ranking of configs
+    :param seed: random seed of held-out cases
+    :return: results table sorted by score (agreement on good outcomes minus agreement on bad outcomes) and held-out
+    TD error
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Preprocess dataset once, workers memory-map its cache
+    episodes_count = Dataset(file_path).episodes_count()
+
+    # Same held-out cases for all configs
+    validation_cases = split_cases(episodes_count, max(2, round(1 / validation)), seed)[0]
+
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(file_path, threads, validation_cases)) as executor:
+        results = list(executor.map(run_config, range(len(configs)), configs, itertools.repeat(output_dir),
+                                    itertools.repeat(early_stopping)))
+
+    results = pd.DataFrame(results).sort_values(['score', 'td_error'], ascending=[False, True])
+    results.to_csv(os.path.join(output_dir, 'results.csv'), index=False)
+
+    shutil.copyfile(results.iloc[0]['path'], os.path.join(output_dir, 'best.pt'))
+
+    return results
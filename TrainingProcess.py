@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+from multiprocessing.connection import Connection
+
+import numpy as np
+import torch
+
+from Agent import Agent
+from Checkpoint import Checkpointer
+from ConvergenceMonitor import ConvergenceMonitor
+from Dataset import Dataset
+from DatasetSchema import DatasetSchema
+from DQN import dqn, create_agent
+
+
+def train_process(connection: Connection, cancel, file_path: str or os.path, config: dict,
+                  checkpoints_directory: str or os.path = None, threads: int = None,
+                  early_stopping: bool = False) -> None:
+    """
+    Function of training child process: runs dqn and sends its events, then Q network weights and schema, by pipe
+
+    :param connection: sending end of pipe
+    :param cancel: multiprocessing event set by parent to abort training
+    :param file_path: path to dataset file
+    :param config: training parameters
+    :param checkpoints_directory: directory of checkpoints to resume from and write (None to disable)
+    :param threads: count of torch threads (None for default)
+    :param early_stopping: stop training by convergence monitor of TD loss
+    :return: None
+    """
+
+    if threads is not None:
+        torch.set_num_threads(threads)
+
+    try:
+        dataset = Dataset(file_path)
+        checkpointer = None if checkpoints_directory is None else \
+            Checkpointer(checkpoints_directory, every_episodes=100, every_seconds=60)
+
+        gen = dqn(dataset, config, monitor=ConvergenceMonitor() if early_stopping else None, checkpointer=checkpointer,
+                  resume=True)
+
+        while True:
+            # Cancelled run keeps its last checkpoint to be resumed later
+            if cancel.is_set():
+                gen.close()
+                if checkpointer is not None:
+                    checkpointer.wait()
+                connection.send({'cancelled': True})
+                return
+
+            try:
+                value = next(gen)
+            except StopIteration as e:
+                agent = e.value
+                break
+
+            connection.send(value)
+
+        # Weights as numpy arrays, tensors are not shared between processes
+        connection.send({'finished': True,
+                         'state_dict': {name: tensor.numpy() for name, tensor in
+                                        agent.return_q_network().state_dict().items()},
+                         'schema': dataset.return_schema().to_dict()})
+    except Exception as error:
+        connection.send({'error': repr(error)})
+    finally:
+        connection.close()
+
+
+def rebuild_agent(dataset: Dataset, state_dict: dict, schema: dict, config: dict = None) -> Agent:
+    """
+    Function to rebuild agent from weights and schema sent by training process
+
+    :param dataset: dataset object of parent process
+    :param state_dict: Q network weights as numpy arrays
+    :param schema: dataset schema dictionary of training process
+    :param config: training parameters
+    :return: agent
+    """
+
+    if DatasetSchema.from_dict(schema) != dataset.return_schema():
+        raise ValueError('Schema of trained agent does not match dataset')
+
+    # Trained agent is used for predicts only, buffer is not needed
+    agent = create_agent(dataset, config, buffer_size=1)
+    agent.set_weights({name: torch.from_numpy(np.asarray(array)) for name, array in state_dict.items()})
+
+    return agent
+
+
+class TrainingProcess:
+    """
+    Class of dqn training in child process with progress streamed by pipe and cancellation
+    """
+
+    def __init__(self, file_path: str or os.path, config: dict, checkpoints_directory: str or os.path = None,
+                 threads: int = None, early_stopping: bool = False) -> None:
+        """
+        Function to init and start training process
+
+        :param file_path: path to dataset file
+        :param config: training parameters
+        :param checkpoints_directory: directory of checkpoints to resume from and write (None to disable)
+        :param threads: count of torch threads of child process (None for default)
+        :param early_stopping: stop training by convergence monitor of TD loss
+        """
+
+        context = multiprocessing.get_context('spawn')
+
+        self.__connection, child_connection = context.Pipe(duplex=False)
+        self.__cancel = context.Event()
+
+        self.__process = context.Process(target=train_process, daemon=True,
+                                         args=(child_connection, self.__cancel, file_path, config,
+                                               checkpoints_directory, threads, early_stopping))
+        self.__process.start()
+
+        # Only child keeps sending end, so parent gets EOFError if child dies
+        child_connection.close()
+
+    def events(self) -> dict:
+        """
+        Function to yield events of training process until finished, cancelled or error event
+
+        :return: generator of events
+        """
+
+        while True:
+            try:
+                event = self.__connection.recv()
+            except EOFError:
+                self.__process.join()
+                yield {'error': f'Training process exited with code {self.__process.exitcode}'}
+                return
+
+            yield event
+
+            if event.get('finished') or event.get('cancelled') or 'error' in event:
+                self.__connection.close()
+                self.__process.join()
+                return
+
+    def cancel(self) -> None:
+        """
+        Function to ask training process to stop after current episode
+
+        :return: None
+        """
+
+        self.__cancel.set()
+
+    def terminate(self) -> None:
+        """
+        Function to kill training process without waiting for episode end
+
+        :return: None
+        """
+
+        self.__process.terminate()
+        self.__process.join()
+
+    def is_alive(self) -> bool:
+        """
+        Function to return is training process running
+
+        :return: running or no
+        """
+
+        return self.__process.is_alive()
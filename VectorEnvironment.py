@@ -0,0 +1,110 @@
+import numpy as np
+
+from Dataset import Dataset
+from Environment import Environment
+
+
+class VectorEnvironment:
+    """
+    Class of environment advancing several cases in lockstep with auto reset onto next unused case
+    """
+
+    def __init__(self, dataset: Dataset, num_envs: int) -> None:
+        """
+        Function to init vector environment by dataset
+
+        :param dataset: dataset object
+        :param num_envs: count of cases advanced at once
+        """
+
+        self.__dataset = dataset
+        self.__num_envs = num_envs
+
+        # Tables of single environment (states, rewards, dones and cases offsets)
+        env = Environment(dataset)
+        self.__states = env.return_states()
+        self.__rewards = env.return_rewards()
+        self.__dones = env.return_dones()
+        self.__offsets = env.return_offsets()
+        self.__cases_count = len(self.__offsets) - 1
+
+        # Current case and line of every slot
+        self.__cases = np.zeros(num_envs, dtype=np.int64)
+        self.__rows = np.zeros(num_envs, dtype=np.int64)
+        self.__active = np.zeros(num_envs, dtype=bool)
+        self.__next_case = 0
+
+    def reset(self, **kwargs) -> np.ndarray:
+        """
+        Function of reset of environment: start first unused cases in all slots
+
+        :return: first states (num_envs x state dimensional)
+        """
+
+        self.__active[:] = True
+        self.__start_cases(np.arange(self.__num_envs))
+
+        return self.__states[self.__rows]
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        Function of environment step by actions of all slots
+
+        :param actions: actions
+        :return: tuple of (next_states, rewards, dones, info); next states of finished slots are first states of
+                 next cases, info has final_states (next states before auto reset) and active (mask of slots which
+                 made a step)
+        """
+
+        active = self.__active.copy()
+
+        dones = np.where(active, self.__dones[self.__rows], 1).astype(np.float32)
+        rewards = np.where(active, self.__rewards[self.__rows], 0.0)
+
+        # Step in not finished cases
+        advance = active & (dones == 0)
+        if np.any(self.__rows[advance] + 1 >= self.__offsets[self.__cases[advance] + 1]):
+            raise IndexError('Case has no line with end of episode')
+        self.__rows[advance] += 1
+
+        final_states = self.__states[self.__rows]
+
+        # Auto reset of finished slots
+        self.__start_cases(np.flatnonzero(active & (dones == 1)))
+
+        return self.__states[self.__rows], rewards, dones, {'final_states': final_states, 'active': active}
+
+    def finished(self) -> bool:
+        """
+        Function to check that all cases are done
+
+        :return: True if there are no active slots
+        """
+
+        return not self.__active.any()
+
+    def return_dataset(self) -> Dataset:
+        """
+        Function to return environment input dataset
+
+        :return: environment input dataset
+        """
+
+        return self.__dataset
+
+    def __start_cases(self, slots: np.ndarray) -> None:
+        """
+        Function to start next unused cases in slots (slots without cases become inactive)
+
+        :param slots: slots numbers
+        :return: None
+        """
+
+        cases = self.__next_case + np.arange(len(slots))
+        started = cases < self.__cases_count
+
+        self.__cases[slots[started]] = cases[started]
+        self.__rows[slots[started]] = self.__offsets[cases[started]]
+        self.__active[slots[~started]] = False
+
+        self.__next_case = min(self.__next_case + len(slots), self.__cases_count)
@@ -0,0 +1,344 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, peak memory is traced by tracemalloc
+    resource = None
+
+
+def peak_memory() -> float:
+    """
+    Function to return peak memory of process
+
+    :return: peak memory in megabytes
+    """
+
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def train(args: argparse.Namespace) -> None:
+    """
+    Function to train agent by dataset file and save it
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from ConvergenceMonitor import ConvergenceMonitor
+    from Dataset import Dataset
+    from DQN import dqn, CONFIG
+    from RunningTracker import RunningTracker
+
+    start_time = time.perf_counter()
+
+    dataset = Dataset(args.file)
+    episodes = dataset.episodes_count()
+
+    # Phases timings and metrics events are written only if telemetry file is set
+    tracker = RunningTracker(enabled=args.telemetry is not None, file_path=args.telemetry)
+
+    gen = dqn(dataset, CONFIG, monitor=ConvergenceMonitor() if args.early_stopping else None, tracker=tracker,
+              plot=args.plot)
+    rows = 0
+
+    while True:
+        try:
+            value = next(gen)
+        except StopIteration as e:
+            agent = e.value
+            break
+
+        if value.get('stopped'):
+            print(f'Stopped at {value["episode"]} from {episodes}: {value["reason"]}')
+        else:
+            rows = value['rows']
+            if value['episode'] % args.log_every == 0:
+                print(f'Episode {value["episode"]} from {episodes}: average reward {value["reward"]:.2f}, '
+                      f'{value["rows_per_second"]:.0f} rows/s')
+
+    tracker.close()
+    agent.save(args.output, CONFIG, replay_size=args.replay_size)
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Saved agent to {args.output}')
+    print(f'{rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s), peak memory {peak_memory():.0f} MB')
+
+
+def update(args: argparse.Namespace) -> None:
+    """
+    Function to fine-tune saved agent on cases appended to dataset file
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from Incremental import incremental_dqn
+
+    start_time = time.perf_counter()
+
+    gen = incremental_dqn(args.model, args.file, output_path=args.output, epochs=args.epochs)
+    while True:
+        try:
+            value = next(gen)
+        except StopIteration as e:
+            agent = e.value
+            break
+        print(f'Epoch {value["epoch"]} from {args.epochs}')
+
+    elapsed = time.perf_counter() - start_time
+    if agent is None:
+        print('There are no new cases')
+    else:
+        print(f'Updated agent by {agent.return_dataset_object().episodes_count()} new cases in {elapsed:.1f} s, '
+              f'peak memory {peak_memory():.0f} MB')
+
+
+def read_chunks(file_path: str, chunk_size: int) -> iter:
+    """
+    Function to read patients states file by chunks
+
+    :param file_path: path to .csv or .pkl file (first .csv column is index)
+    :param chunk_size: count of rows in chunk
+    :return: iterator of dataframes
+    """
+
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, index_col=0, chunksize=chunk_size)
+    else:
+        dataset = pd.read_pickle(file_path)
+        for start in range(0, len(dataset), chunk_size):
+            yield dataset.iloc[start:start + chunk_size]
+
+
+def predict(args: argparse.Namespace) -> None:
+    """
+    Function to write recommended treatments for all patients states of file
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from NumpyPredictor import load_predictor, impute_states
+
+    start_time = time.perf_counter()
+
+    predictor = load_predictor(args.model)
+    state_columns = list(predictor.return_schema().return_state_columns())
+    rows = 0
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+
+    state_means = predictor.return_state_means()
+    imputed_rows = 0
+
+    for chunk in read_chunks(args.input, args.chunk_size):
+        states, imputed = impute_states(chunk[state_columns].to_numpy(), state_means)
+        treatments = pd.Series(predictor.predict_batch(states)[0], index=chunk.index, dtype=object)
+
+        # Rows with missing values are flagged, without training means they get no treatment
+        if state_means is None:
+            treatments[imputed] = None
+
+        pd.DataFrame({'treatment': treatments, 'imputed': imputed}, index=chunk.index).to_csv(
+            args.output, mode='a', header=rows == 0)
+        rows += len(chunk)
+        imputed_rows += int(imputed.sum())
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Wrote {rows} predicts to {args.output}')
+    if imputed_rows:
+        print(f'{imputed_rows} rows had missing values: ' +
+              ('imputed by training means' if state_means is not None else 'no treatment (model has no means)'))
+    print(f'{rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s), peak memory {peak_memory():.0f} MB')
+
+
+def serve(args: argparse.Namespace) -> None:
+    """
+    Function to serve saved agent on localhost
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from Server import PredictionServer
+
+    server = PredictionServer(args.model, port=args.port, max_batch_size=args.max_batch_size,
+                              max_wait_ms=args.max_wait_ms, request_timeout=args.request_timeout)
+    host, port = server.address()
+    print(f'Serving {args.model} on http://{host}:{port} (POST /predict, GET /stats)')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(server.stats())
+
+
+def sweep(args: argparse.Namespace) -> None:
+    """
+    Function to run hyperparameters sweep by json search space
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    import json
+
+    from Sweep import grid_search, random_search, sweep as run_sweep, SPACE
+
+    if args.space is None:
+        space = SPACE
+    else:
+        with open(args.space) as file:
+            space = json.load(file)
+
+    if args.random:
+        configs = random_search({parameter: tuple(values['range']) if isinstance(values, dict) else values
+                                 for parameter, values in space.items()}, args.random, seed=args.seed)
+    else:
+        configs = grid_search(space)
+
+    results = run_sweep(args.file, configs, args.output, workers=args.workers, threads=args.threads,
+                        early_stopping=args.early_stopping, validation=args.validation)
+
+    print(results.drop(columns='path').to_string(index=False))
+    print(f'Best agent saved to {os.path.join(args.output, "best.pt")}')
+
+
+def validate(args: argparse.Namespace) -> None:
+    """
+    Function to run K-fold cross-validation of training by cases
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from CrossValidation import cross_validation
+
+    report = cross_validation(args.file, folds=args.folds, workers=args.workers, threads=args.threads, seed=args.seed)
+
+    print(report.to_string())
+
+    if args.output:
+        report.to_csv(args.output)
+
+
+def export(args: argparse.Namespace) -> None:
+    """
+    Function to export Q network of saved agent to TorchScript, ONNX or NumPy weights
+
+    :param args: command line arguments
+    :return: None
+    """
+
+    from Export import export_torchscript, export_onnx, export_numpy
+    from Predictor import Predictor
+
+    exporters = {'torchscript': (export_torchscript, '.ts.pt'), 'onnx': (export_onnx, '.onnx'),
+                 'numpy': (export_numpy, '.npz')}
+    exporter, extension = exporters[args.format]
+
+    output = args.output or os.path.splitext(args.model)[0] + extension
+    exporter(Predictor(args.model), output)
+
+    print(f'Exported {args.model} to {output}')
+
+
+def main(argv: list = None) -> None:
+    """
+    Function of command line entry point
+
+    :param argv: command line arguments (sys.argv if None)
+    :return: None
+    """
+
+    parser = argparse.ArgumentParser(description='COVID-19 treatment predictor without GUI')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='train agent by .pkl file and save it')
+    train_parser.add_argument('file', help='.pkl file with patients data')
+    train_parser.add_argument('-o', '--output', default='agent.pt', help='path of saved agent')
+    train_parser.add_argument('--log-every', type=int, default=100, help='episodes between progress lines')
+    train_parser.add_argument('--early-stopping', action='store_true',
+                              help='stop when TD loss stops falling (all episodes by default)')
+    train_parser.add_argument('--replay-size', type=int, default=10000,
+                              help='transitions saved with agent for incremental update')
+    train_parser.add_argument('--telemetry', default=None,
+                              help='.jsonl file of per-episode metrics and training phases timings')
+    train_parser.add_argument('--plot', action='store_true', help='plot average reward per episode after training')
+    train_parser.set_defaults(function=train)
+
+    update_parser = subparsers.add_parser('update', help='fine-tune saved agent on new cases of dataset file')
+    update_parser.add_argument('model', help='agent saved by train')
+    update_parser.add_argument('file', help='.pkl file with patients data including new cases')
+    update_parser.add_argument('-o', '--output', default=None, help='path of updated agent (model if not set)')
+    update_parser.add_argument('--epochs', type=int, default=10, help='passes over new transitions')
+    update_parser.set_defaults(function=update)
+
+    predict_parser = subparsers.add_parser('predict', help='write recommended treatments for patients states')
+    predict_parser.add_argument('model', help='saved agent or .npz of export --format numpy')
+    predict_parser.add_argument('input', help='.csv or .pkl file with patients states')
+    predict_parser.add_argument('-o', '--output', default='predicts.csv', help='path of .csv file with treatments')
+    predict_parser.add_argument('--chunk-size', type=int, default=100000, help='rows in one batch')
+    predict_parser.set_defaults(function=predict)
+
+    serve_parser = subparsers.add_parser('serve', help='serve saved agent on localhost with micro-batching')
+    serve_parser.add_argument('model', help='saved agent or .npz of export --format numpy')
+    serve_parser.add_argument('--port', type=int, default=8000, help='port to listen')
+    serve_parser.add_argument('--max-batch-size', type=int, default=256, help='maximum states in one forward pass')
+    serve_parser.add_argument('--max-wait-ms', type=float, default=5.0, help='maximum wait for batch filling')
+    serve_parser.add_argument('--request-timeout', type=float, default=30.0, help='maximum wait for predicts in seconds')
+    serve_parser.set_defaults(function=serve)
+
+    sweep_parser = subparsers.add_parser('sweep', help='train agents for grid or random search space in parallel')
+    sweep_parser.add_argument('file', help='.pkl file with patients data')
+    sweep_parser.add_argument('space', nargs='?', default=None, help='json of lists of values by parameter ({"range": [low, high]} for '
+                                            'uniform values in random search, default space if not set)')
+    sweep_parser.add_argument('-o', '--output', default='sweep', help='directory for results and agents')
+    sweep_parser.add_argument('--random', type=int, default=0, help='count of random configs (grid if 0)')
+    sweep_parser.add_argument('--seed', type=int, default=None, help='random search seed')
+    sweep_parser.add_argument('--workers', type=int, default=None, help='count of processes')
+    sweep_parser.add_argument('--threads', type=int, default=1, help='torch threads of every process')
+    sweep_parser.add_argument('--early-stopping', action='store_true', help='stop every run when TD loss stops falling')
+    sweep_parser.add_argument('--validation', type=float, default=0.2, help='share of held-out cases for ranking')
+    sweep_parser.set_defaults(function=sweep)
+
+    validate_parser = subparsers.add_parser('validate', help='K-fold cross-validation with offline evaluation')
+    validate_parser.add_argument('file', help='.pkl file with patients data')
+    validate_parser.add_argument('--folds', type=int, default=5, help='count of folds')
+    validate_parser.add_argument('-o', '--output', default=None, help='path of .csv file with report')
+    validate_parser.add_argument('--seed', type=int, default=None, help='random seed of split')
+    validate_parser.add_argument('--workers', type=int, default=None, help='count of processes')
+    validate_parser.add_argument('--threads', type=int, default=1, help='torch threads of every process')
+    validate_parser.set_defaults(function=validate)
+
+    export_parser = subparsers.add_parser('export', help='export saved agent to TorchScript, ONNX or NumPy weights')
+    export_parser.add_argument('model', help='saved agent')
+    export_parser.add_argument('--format', choices=('torchscript', 'onnx', 'numpy'), default='numpy',
+                               help='export format (numpy weights are served and predicted without torch)')
+    export_parser.add_argument('-o', '--output', default=None, help='path of exported file (next to model if not set)')
+    export_parser.set_defaults(function=export)
+
+    args = parser.parse_args(argv)
+
+    if resource is None:
+        tracemalloc.start()
+
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()